@@ -0,0 +1,244 @@
+"""Append-only columnar archive of energy details for reports over many years.
+
+Timestamps, energies and charger indexes are kept in fixed-width column files
+in native byte order, next to a block index of the time range of every
+BLOCK_ROWS rows. Readers memory map the columns and get the rows of a time
+window as memoryviews, which the cost calculation reads without copying.
+"""
+
+import json
+import mmap
+import os
+import sqlite3
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+import fire
+
+import config
+import costs
+import metrics
+import mgrey
+import store
+import tariffs
+from energy import EnergyColumns
+from periods import parse_periods
+
+BLOCK_ROWS = 4096
+# Rows read from the store before they are appended, bounds memory on a first update
+APPEND_ROWS = 65536
+COLUMNS = {"timestamps": "q", "energies": "d", "chargers": "I"}
+
+
+@dataclass
+class ColumnsView:
+    """Rows of the archive, with the same columns as EnergyColumns."""
+
+    timestamps: memoryview
+    energies: memoryview
+    chargers: memoryview
+    charger_ids: list[str]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class Archive:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta_path = self.path / "meta.json"
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+        # Rows past the committed count are left over from an interrupted append
+        self.rows: int = meta.get("rows", 0)
+        self.chargers: list[dict] = meta.get("chargers", [])
+        # First and last archived timestamp of each charger
+        self.ranges: dict[str, list[int]] = meta.get("ranges", {})
+        self.blocks = array("q")
+        blocks_path = self.path / "blocks"
+        if blocks_path.exists():
+            with open(blocks_path, "rb") as f:
+                self.blocks.frombytes(f.read(-(-self.rows // BLOCK_ROWS) * 16))
+        self._maps: dict[str, mmap.mmap] = {}
+
+    @property
+    def charger_ids(self) -> list[str]:
+        return [charger["Id"] for charger in self.chargers]
+
+    def append(self, columns: EnergyColumns, known: Optional[dict[str, dict]] = None):
+        """Append rows, best in time order per charger so blocks span little time.
+        Known chargers give the names and installations that pricing is
+        configured by."""
+        if not len(columns):
+            return
+        index = {charger_id: i for i, charger_id in enumerate(self.charger_ids)}
+        for charger_id in columns.charger_ids:
+            if charger_id not in index:
+                index[charger_id] = len(self.chargers)
+                self.chargers.append({"Id": charger_id})
+            if known and charger_id in known:
+                self.chargers[index[charger_id]] = known[charger_id]
+        mapping = [index[charger_id] for charger_id in columns.charger_ids]
+
+        chargers = array("I", (mapping[charger] for charger in columns.chargers))
+        for name, values in (
+            ("timestamps", columns.timestamps),
+            ("energies", columns.energies),
+            ("chargers", chargers),
+        ):
+            with open(self.path / name, "ab") as f:
+                f.truncate(self.rows * values.itemsize)
+                values.tofile(f)
+
+        # Widen the time range of the last block and add ranges of new blocks
+        for i, timestamp in enumerate(columns.timestamps, start=self.rows):
+            block = i // BLOCK_ROWS * 2
+            if block == len(self.blocks):
+                self.blocks.extend((timestamp, timestamp))
+            else:
+                self.blocks[block] = min(self.blocks[block], timestamp)
+                self.blocks[block + 1] = max(self.blocks[block + 1], timestamp)
+        with open(self.path / "blocks", "wb") as f:
+            self.blocks.tofile(f)
+
+        for timestamp, charger in zip(columns.timestamps, columns.chargers):
+            charger_id = columns.charger_ids[charger]
+            first, last = self.ranges.get(charger_id, (timestamp, timestamp))
+            self.ranges[charger_id] = [min(first, timestamp), max(last, timestamp)]
+        self.rows += len(columns)
+        self._maps = {}
+
+        # The new rows count once the metadata is replaced
+        meta = {"rows": self.rows, "chargers": self.chargers, "ranges": self.ranges}
+        (self.path / "meta.json.tmp").write_text(json.dumps(meta))
+        os.replace(self.path / "meta.json.tmp", self.path / "meta.json")
+        metrics.count("archive_appended_rows", len(columns))
+
+    def column(self, name: str, start: int, end: int) -> memoryview:
+        if name not in self._maps:
+            with open(self.path / name, "rb") as f:
+                self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = array(COLUMNS[name]).itemsize
+        return memoryview(self._maps[name])[start * size : end * size].cast(
+            COLUMNS[name]
+        )
+
+    def window(self, first: int, last: int) -> Iterator[ColumnsView]:
+        """Get the rows of the blocks with timestamps from first to last. Blocks
+        can hold rows outside of the window, the cost calculation skips them."""
+        charger_ids = self.charger_ids
+        start = None
+        for block in range(len(self.blocks) // 2 + 1):
+            overlaps = (
+                block < len(self.blocks) // 2
+                and self.blocks[block * 2] <= last
+                and self.blocks[block * 2 + 1] >= first
+            )
+            if overlaps and start is None:
+                start = block * BLOCK_ROWS
+            elif not overlaps and start is not None:
+                end = min(block * BLOCK_ROWS, self.rows)
+                metrics.count("archive_window_rows", end - start)
+                yield ColumnsView(
+                    *(self.column(name, start, end) for name in COLUMNS), charger_ids
+                )
+                start = None
+
+
+def append_new_details(archive: Archive, connection: sqlite3.Connection) -> int:
+    """Append the details that were stored since the last update, before or after
+    the archived range of each charger. Returns the number of rows appended."""
+    # Syncs only extend the stored history of a charger at either end
+    ranges = dict(archive.ranges)
+    known = store.known_chargers(connection)
+    charger_ids = [
+        charger_id
+        for (charger_id,) in connection.execute(
+            "SELECT DISTINCT charger_id FROM energy_details"
+        )
+    ]
+
+    appended = 0
+    columns = EnergyColumns()
+    for charger_id in charger_ids:
+        first, last = ranges.get(charger_id, (0, -1))
+        rows = connection.execute(
+            "SELECT timestamp, energy FROM energy_details WHERE charger_id = ?"
+            " AND (timestamp < ? OR timestamp > ?) ORDER BY timestamp",
+            (charger_id, first, last),
+        )
+        for timestamp, energy in rows:
+            columns.append(charger_id, timestamp, energy)
+            if len(columns) == APPEND_ROWS:
+                archive.append(columns, known)
+                appended += len(columns)
+                columns = EnergyColumns()
+    archive.append(columns, known)
+    return appended + len(columns)
+
+
+def bucket_totals(
+    archive: Archive, pricing: tariffs.PricingEngine, buckets: list[tuple[int, int]]
+) -> dict[str, list[costs.Totals]]:
+    """Sum energy and cost per archived charger into each (first, last) epoch second
+    bucket, with one pass over the window per pricing."""
+    first = min(first for first, _ in buckets)
+    last = max(last for _, last in buckets)
+    groups: dict[str, list[int]] = {}
+    for i, charger in enumerate(archive.chargers):
+        groups.setdefault(pricing.fingerprint(charger), []).append(i)
+
+    results = {
+        charger_id: [costs.Totals() for _ in buckets]
+        for charger_id in archive.charger_ids
+    }
+    for indexes in groups.values():
+        table = pricing.charger_table(archive.chargers[indexes[0]], first, last)
+        for columns in archive.window(
+            first + costs.PRICE_OFFSET, last + costs.PRICE_OFFSET
+        ):
+            totals = costs.bucket_totals(columns, table, buckets, set(indexes))
+            for charger_id, charger_totals in totals.items():
+                for result, total in zip(results[charger_id], charger_totals):
+                    result.energy += total.energy
+                    result.cost += total.cost
+    return results
+
+
+def update(path: Optional[str] = None):
+    """Append the details that are new in the history store to the archive."""
+    archive = Archive(Path(path) if path else config.get_archive_path())
+    connection = store.connect()
+    try:
+        appended = append_new_details(archive, connection)
+    finally:
+        connection.close()
+    print(f"Appended {appended} rows, {archive.rows} in total")
+
+
+def report(periods="Q2", path: Optional[str] = None):
+    """Print energy and cost of every archived charger for each period."""
+    archive = Archive(Path(path) if path else config.get_archive_path())
+    report_periods = parse_periods(periods)
+    pricing = tariffs.PricingEngine()
+    pricing.prefetch(
+        min(start for _, start, _ in report_periods).astimezone(mgrey.TIMEZONE).date(),
+        max(end for _, _, end in report_periods).astimezone(mgrey.TIMEZONE).date(),
+    )
+    buckets = [
+        (int(start.timestamp()), int(end.timestamp()))
+        for _, start, end in report_periods
+    ]
+    totals = bucket_totals(archive, pricing, buckets)
+    for charger in archive.chargers:
+        for (label, _, _), total in zip(report_periods, totals[charger["Id"]]):
+            print(
+                f"{charger.get('Name', charger['Id'])}\t{label}"
+                f"\t{total.energy:.2f} kWh\t{total.cost:.2f} kr"
+            )
+
+
+if __name__ == "__main__":
+    fire.Fire({"update": update, "report": report})
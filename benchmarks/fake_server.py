@@ -0,0 +1,212 @@
+import datetime
+import json
+import math
+import threading
+import time
+import zoneinfo
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+AREAS = ("SE1", "SE2", "SE3", "SE4")
+LOCAL_TIMEZONE = zoneinfo.ZoneInfo("Europe/Stockholm")
+
+
+class FakeServer(ThreadingHTTPServer):
+    """Local stand-in for the Zaptec API and mgrey.se.
+
+    Every charger has one session per day, starting at 18:00 UTC, with
+    `details_per_session` quarter-hour energy details.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        chargers: int = 10,
+        details_per_session: int = 16,
+        latency: float = 0.0,
+        throttle: float | None = None,
+    ):
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+        self.chargers = chargers
+        self.details_per_session = details_per_session
+        self.latency = latency
+        self.throttle = throttle
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    def throttled(self) -> bool:
+        """Allow at most `throttle` requests within any one second window."""
+        if self.throttle is None:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 1.0:
+                self.recent.popleft()
+            if len(self.recent) >= self.throttle:
+                return True
+            self.recent.append(now)
+            return False
+
+    def charger(self, i: int) -> dict:
+        return {
+            "Id": f"charger-{i}",
+            "Name": f"Charger {i}",
+            "InstallationId": f"installation-{i % 2}",
+        }
+
+    def charger_list(self, query: dict) -> dict:
+        page_size = int(query.get("PageSize", ["100"])[0])
+        page_index = int(query.get("PageIndex", ["0"])[0])
+        chargers = [self.charger(i) for i in range(self.chargers)]
+        if "InstallationId" in query:
+            installation_id = query["InstallationId"][0]
+            chargers = [c for c in chargers if c["InstallationId"] == installation_id]
+        if "SearchString" in query:
+            search = query["SearchString"][0].lower()
+            chargers = [c for c in chargers if search in c["Name"].lower()]
+        return {
+            "Pages": max(1, math.ceil(len(chargers) / page_size)),
+            "Data": chargers[page_index * page_size : (page_index + 1) * page_size],
+        }
+
+    def session(self, charger_id: str, day: datetime.date) -> dict:
+        start = datetime.datetime.combine(day, datetime.time(18), datetime.UTC)
+        details = [
+            {
+                "Timestamp": (start + datetime.timedelta(minutes=15 * i)).isoformat(),
+                "Energy": 0.0 if i == 0 else 2.75,
+            }
+            for i in range(self.details_per_session)
+        ]
+        # Two tenants take turns charging
+        user = day.toordinal() % 2
+        return {
+            "Id": f"{charger_id}-{day.isoformat()}",
+            "ChargerId": charger_id,
+            "UserId": f"user-{user}",
+            "UserFullName": f"Tenant {user}",
+            "TokenName": f"Tag {user}",
+            "StartDateTime": start.replace(tzinfo=None).isoformat(),
+            "EndDateTime": details[-1]["Timestamp"][:19],
+            "Energy": sum(d["Energy"] for d in details),
+            "EnergyDetails": details,
+        }
+
+    def charge_history(self, query: dict) -> dict:
+        from_date = datetime.datetime.fromisoformat(query["From"][0])
+        to_date = datetime.datetime.fromisoformat(query["To"][0])
+        page_size = int(query.get("PageSize", ["10"])[0])
+        page_index = int(query.get("PageIndex", ["0"])[0])
+
+        # Days whose session starts within the period, newest first like Zaptec
+        first = from_date.astimezone(datetime.UTC)
+        last = to_date.astimezone(datetime.UTC)
+        days = []
+        day = first.date()
+        while day <= last.date():
+            start = datetime.datetime.combine(day, datetime.time(18), datetime.UTC)
+            if first <= start <= last:
+                days.append(day)
+            day += datetime.timedelta(days=1)
+        days.reverse()
+
+        page = days[page_index * page_size : (page_index + 1) * page_size]
+        return {
+            "Pages": math.ceil(len(days) / page_size),
+            "Data": [self.session(query["ChargerId"][0], day) for day in page],
+        }
+
+    def prices(self, query: dict) -> dict:
+        date = datetime.date.fromisoformat(query["date"][0])
+        # Hours of the local day, 23 or 25 on DST days
+        start = datetime.datetime.combine(date, datetime.time(), LOCAL_TIMEZONE)
+        end = datetime.datetime.combine(
+            date + datetime.timedelta(days=1), datetime.time(), LOCAL_TIMEZONE
+        )
+        hours = int(end.timestamp() - start.timestamp()) // 3600
+        return {
+            "date": date.isoformat(),
+            **{
+                area: [
+                    {"hour": hour % 24, "price_sek": 50.0 + 10 * i + hour}
+                    for hour in range(hours)
+                ]
+                for i, area in enumerate(AREAS)
+            },
+        }
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    server: FakeServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, avoid delayed ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status: int, body: dict | None = None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def handle_request(self, method: str):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        with self.server.lock:
+            self.server.requests[url.path] += 1
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if url.path == "/espot":
+            return self.respond(200, self.server.prices(query))
+
+        if self.server.throttled():
+            return self.respond(429, {}, {"Retry-After": "1"})
+
+        if method == "POST" and url.path == "/oauth/token":
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            return self.respond(
+                200, {"access_token": "fake-token", "expires_in": 86400}
+            )
+        if self.headers.get("Authorization") != "Bearer fake-token":
+            return self.respond(401, {})
+        if url.path == "/api/chargers":
+            return self.respond(200, self.server.charger_list(query))
+        if url.path.startswith("/api/chargers/charger-"):
+            i = int(url.path.rsplit("-", 1)[1])
+            if i < self.server.chargers:
+                return self.respond(200, self.server.charger(i))
+        if url.path == "/api/chargehistory":
+            return self.respond(200, self.server.charge_history(query))
+        return self.respond(404, {})
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
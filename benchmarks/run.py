@@ -0,0 +1,193 @@
+"""Throughput benchmarks against a local fake Zaptec and mgrey server.
+
+Run all scenarios, or a single one, from the repository root:
+
+    uv run python -m benchmarks.run
+    uv run python -m benchmarks.run --scenario=100-quarter --latency=0.05
+"""
+
+import datetime
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+import fire
+from rich.console import Console
+from rich.table import Table
+
+import headless
+import http_client
+import main
+import metrics
+import mgrey
+import tariffs
+import zaptec
+from benchmarks.fake_server import FakeServer
+
+PERIODS = {"quarter": 91, "year": 365}
+SCENARIOS = {
+    f"{chargers}-{period}": (chargers, PERIODS[period])
+    for period in PERIODS
+    for chargers in (10, 100, 1000)
+}
+
+
+@dataclass
+class Result:
+    scenario: str
+    wall_time: float
+    requests: int
+    peak_memory: int
+    rows: int
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.wall_time if self.wall_time else 0.0
+
+
+def reset_state():
+    """Forget tokens, rate limiters, sessions and cached prices between scenarios."""
+    zaptec._token = None
+    zaptec._rate_limiters.clear()
+    http_client.set_session(None)
+    mgrey.get_prices.cache_clear()
+    metrics.reset()
+
+
+def priced_samples() -> int:
+    """Energy details priced since the last reset, counted where they are priced."""
+    return int(
+        sum(
+            counter["value"]
+            for counter in metrics.snapshot()["counters"]
+            if counter["name"] == "priced_samples"
+        )
+    )
+
+
+def peak_rss() -> int:
+    """Peak resident memory of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_pipeline(
+    start_date: datetime.datetime, end_date: datetime.datetime, workers: int
+) -> int:
+    """Run the same steps as main.main without rendering. Returns the number of sessions."""
+    chargers = zaptec.list_chargers()
+    pricing = tariffs.PricingEngine()
+    pricing.prefetch(start_date.date(), end_date.date())
+
+    with (
+        headless.QuietProgress() as progress,
+        ThreadPoolExecutor(max_workers=workers) as executor,
+    ):
+        futures = [
+            executor.submit(
+                main.process_charger,
+                charger,
+                [("benchmark", start_date, end_date)],
+                progress,
+                pricing,
+            )
+            for charger in chargers
+        ]
+        return sum(future.result()[0][0] for future in futures)
+
+
+def run_scenario(
+    name: str,
+    chargers: int,
+    days: int,
+    latency: float = 0.02,
+    throttle: float | None = None,
+    workers: int = 8,
+    details_per_session: int = 16,
+) -> Result:
+    # Use past dates, so prices are final and stored like in a real run
+    end_date = datetime.datetime(2025, 1, 1, tzinfo=datetime.UTC)
+    start_date = end_date - datetime.timedelta(days=days)
+
+    with (
+        tempfile.TemporaryDirectory() as tmp,
+        FakeServer(chargers, details_per_session, latency, throttle) as server,
+    ):
+        env = {
+            "ZAPTEC_USERNAME": "benchmark",
+            "ZAPTEC_PASSWORD": "benchmark",
+            "ZAPTEC_BASE_URL": server.url,
+            "ZAPTEC_RATE_LIMIT": str(throttle or 10_000),
+            "MGREY_BASE_URL": server.url,
+            "CHARGING_COSTS_STORE": os.path.join(tmp, "history.db"),
+            "CHARGING_COSTS_PRICE_STORE": os.path.join(tmp, "prices.db"),
+        }
+        saved_env = {key: os.environ.get(key) for key in env}
+        os.environ.update(env)
+        reset_state()
+        try:
+            started = time.perf_counter()
+            run_pipeline(start_date, end_date, workers)
+            wall_time = time.perf_counter() - started
+            rows = priced_samples()
+        finally:
+            reset_state()
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+        return Result(
+            scenario=name,
+            wall_time=wall_time,
+            requests=sum(server.requests.values()),
+            peak_memory=peak_rss(),
+            rows=rows,
+        )
+
+
+def benchmark(
+    scenario: str = "all",
+    latency: float = 0.02,
+    throttle: float | None = None,
+    workers: int = 8,
+    details_per_session: int = 16,
+):
+    names = list(SCENARIOS) if scenario == "all" else [scenario]
+
+    table = Table("Scenario", "Wall time", "Requests", "Peak RSS", "Rows/s")
+    for name in names:
+        chargers, days = SCENARIOS[name]
+        # A fresh process per scenario gives a clean peak memory and module state
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            result = executor.submit(
+                run_scenario,
+                name,
+                chargers,
+                days,
+                latency,
+                throttle,
+                workers,
+                details_per_session,
+            ).result()
+        table.add_row(
+            result.scenario,
+            f"{result.wall_time:.2f} s",
+            str(result.requests),
+            f"{result.peak_memory / 2**20:.1f} MiB",
+            f"{result.rows_per_second:,.0f}",
+        )
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    fire.Fire(benchmark)
@@ -0,0 +1,155 @@
+"""Record HTTP exchanges to a compressed archive and replay them without network.
+
+The archive is gzipped JSON lines, one exchange per line. Every exchange is
+written as its own gzip member, so threads and worker processes can append to
+the same archive and a crashed run keeps what it recorded.
+"""
+
+import gzip
+import json
+import threading
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where only the threads of one process take turns appending
+    fcntl = None
+
+# Content is stored decoded, so the length and encoding no longer apply
+SKIPPED_HEADERS = {
+    "content-encoding",
+    "content-length",
+    "transfer-encoding",
+    "set-cookie",
+}
+REDACTED_FIELDS = ("access_token", "refresh_token")
+
+_record_lock = threading.Lock()
+_archives: dict[str, "Archive"] = {}
+_archives_lock = threading.Lock()
+
+
+def exchange_key(method: str, url: str) -> str:
+    """Identify a request by method and URL, ignoring the order of query parameters.
+    Bodies are not part of the key, they hold credentials."""
+    parts = urlparse(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method} {parts.scheme}://{parts.netloc}{parts.path}?{query}"
+
+
+def redact(content: str) -> str:
+    """Replace tokens in a JSON response, they must not end up in an archive."""
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return content
+    if not isinstance(body, dict) or not any(f in body for f in REDACTED_FIELDS):
+        return content
+    for field in REDACTED_FIELDS:
+        if field in body:
+            body[field] = "replayed"
+    return json.dumps(body)
+
+
+def start(path: str):
+    """Empty the archive before a recording."""
+    open(path, "wb").close()
+
+
+def record(path: str, request: requests.PreparedRequest, response: requests.Response):
+    line = json.dumps(
+        {
+            "key": exchange_key(request.method, request.url),
+            "status": response.status_code,
+            "headers": {
+                name: value
+                for name, value in response.headers.items()
+                if name.lower() not in SKIPPED_HEADERS
+            },
+            "content": redact(response.content.decode("utf-8")),
+        }
+    )
+    member = gzip.compress(f"{line}\n".encode(), mtime=0)
+    with _record_lock, open(path, "ab") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        f.write(member)
+
+
+class Archive:
+    """Recorded responses by request. A request made more often than it was
+    recorded gets the last recorded response again."""
+
+    def __init__(self, path: str):
+        self.exchanges: dict[str, list[dict]] = {}
+        with gzip.open(path, "rt") as f:
+            for line in f:
+                exchange = json.loads(line)
+                self.exchanges.setdefault(exchange["key"], []).append(exchange)
+        self.replayed: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def next(self, key: str) -> Optional[dict]:
+        exchanges = self.exchanges.get(key)
+        if not exchanges:
+            return None
+        with self.lock:
+            i = self.replayed.get(key, 0)
+            self.replayed[key] = i + 1
+        return exchanges[min(i, len(exchanges) - 1)]
+
+
+def get_archive(path: str) -> Archive:
+    """Load an archive once per process, all sessions replay from the same one."""
+    with _archives_lock:
+        if path not in _archives:
+            _archives[path] = Archive(path)
+        return _archives[path]
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Send requests over the network and append the final responses, after
+    retries, to an archive."""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def send(self, request, *args, **kwargs):
+        response = super().send(request, *args, **kwargs)
+        record(self.path, request, response)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Answer requests from an archive."""
+
+    def __init__(self, archive: Archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, *args, **kwargs):
+        key = exchange_key(request.method, request.url)
+        exchange = self.archive.next(key)
+        if exchange is None:
+            raise requests.ConnectionError(
+                f"No recorded response for {key}", request=request
+            )
+
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.headers = CaseInsensitiveDict(exchange["headers"])
+        response._content = exchange["content"].encode()
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
@@ -1,7 +1,9 @@
+import math
 import os
 import json
 from pathlib import Path
 from getpass import getpass
+from typing import Optional
 
 CONFIG_FILE = Path.home() / ".charging-costs" / "config.json"
 
@@ -64,6 +66,23 @@ def get_zaptec_credentials() -> tuple[str, str]:
     return username, password
 
 
+def get_accounts() -> list[dict]:
+    """Get the Zaptec accounts to report on from a JSON file named in the environment,
+    or from config. Defaults to the single configured account."""
+    path = os.getenv("CHARGING_COSTS_ACCOUNTS")
+    if path:
+        with open(path, "r") as f:
+            return json.load(f)
+
+    config = load_config()
+    accounts = config.get("accounts")
+    if accounts:
+        return accounts
+
+    username, password = get_zaptec_credentials()
+    return [{"name": username, "username": username, "password": password}]
+
+
 def get_zaptec_base_url() -> str:
     """Get Zaptec base URL from environment or config."""
     url = os.getenv("ZAPTEC_BASE_URL")
@@ -72,3 +91,138 @@ def get_zaptec_base_url() -> str:
 
     config = load_config()
     return config.get("zaptec_base_url", "https://api.zaptec.com")
+
+
+def get_mgrey_base_url() -> str:
+    """Get mgrey spot price base URL from environment or config."""
+    url = os.getenv("MGREY_BASE_URL")
+    if url:
+        return url
+
+    config = load_config()
+    return config.get("mgrey_base_url", "https://mgrey.se")
+
+
+def get_zaptec_rate_limit() -> float:
+    """Get the max number of Zaptec requests per second from environment or config."""
+    # Replayed responses are read from an archive, there is no server to protect
+    if get_replay_path():
+        return math.inf
+
+    rate = os.getenv("ZAPTEC_RATE_LIMIT")
+    if rate:
+        return float(rate)
+
+    config = load_config()
+    return float(config.get("zaptec_rate_limit", 10))
+
+
+def get_record_path() -> Optional[str]:
+    """Get the archive to record HTTP exchanges to from environment or config."""
+    path = os.getenv("CHARGING_COSTS_RECORD")
+    if path:
+        return path
+
+    config = load_config()
+    return config.get("record")
+
+
+def get_replay_path() -> Optional[str]:
+    """Get the archive to replay HTTP exchanges from, instead of the network, from
+    environment or config."""
+    path = os.getenv("CHARGING_COSTS_REPLAY")
+    if path:
+        return path
+
+    config = load_config()
+    return config.get("replay")
+
+
+def get_http_timeout() -> float:
+    """Get the HTTP request timeout in seconds from environment or config."""
+    timeout = os.getenv("HTTP_TIMEOUT")
+    if timeout:
+        return float(timeout)
+
+    config = load_config()
+    return float(config.get("http_timeout", 30))
+
+
+def get_http_pool_size() -> int:
+    """Get the HTTP connection pool size per host from environment or config."""
+    pool_size = os.getenv("HTTP_POOL_SIZE")
+    if pool_size:
+        return int(pool_size)
+
+    config = load_config()
+    return int(config.get("http_pool_size", 16))
+
+
+def get_price_area() -> str:
+    """Get the default spot price area, SE1 to SE4, from environment or config."""
+    area = os.getenv("PRICE_AREA")
+    if area:
+        return area
+
+    config = load_config()
+    return config.get("price_area", "SE3")
+
+
+def get_default_tariff() -> str:
+    """Get the name of the tariff of chargers without one from environment or config."""
+    tariff = os.getenv("DEFAULT_TARIFF")
+    if tariff:
+        return tariff
+
+    config = load_config()
+    return config.get("default_tariff", "spot")
+
+
+def get_tariffs() -> dict[str, dict]:
+    """Get the tariffs by name from config."""
+    return load_config().get("tariffs", {})
+
+
+def get_charger_pricing() -> dict[str, dict]:
+    """Get the area and tariff by charger id, charger name or installation id from config."""
+    return load_config().get("charger_pricing", {})
+
+
+def get_charger_cache_ttl() -> float:
+    """Get how many seconds a charger listing is reused from environment or config."""
+    ttl = os.getenv("CHARGER_CACHE_TTL")
+    if ttl:
+        return float(ttl)
+
+    config = load_config()
+    return float(config.get("charger_cache_ttl", 3600))
+
+
+def get_store_path() -> Path:
+    """Get the path of the local charge history store from environment or config."""
+    path = os.getenv("CHARGING_COSTS_STORE")
+    if path:
+        return Path(path)
+
+    config = load_config()
+    return Path(config.get("store_path", CONFIG_FILE.parent / "history.db"))
+
+
+def get_archive_path() -> Path:
+    """Get the directory of the columnar energy archive from environment or config."""
+    path = os.getenv("CHARGING_COSTS_ARCHIVE")
+    if path:
+        return Path(path)
+
+    config = load_config()
+    return Path(config.get("archive_path", CONFIG_FILE.parent / "archive"))
+
+
+def get_price_store_path() -> Path:
+    """Get the path of the local spot price store from environment or config."""
+    path = os.getenv("CHARGING_COSTS_PRICE_STORE")
+    if path:
+        return Path(path)
+
+    config = load_config()
+    return Path(config.get("price_store_path", CONFIG_FILE.parent / "prices.db"))
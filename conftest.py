@@ -0,0 +1,40 @@
+import pytest
+
+import store
+
+
+class FakePriceIndex:
+    def price_at(self, timestamp):
+        # 1 kr/kWh before 10:00 UTC on 2025-06-07, 2 kr/kWh after
+        return 1.0 if timestamp < 1749290400 else 2.0
+
+
+@pytest.fixture
+def price_index():
+    return FakePriceIndex()
+
+
+@pytest.fixture
+def connection():
+    connection = store.connect(":memory:")
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def make_session():
+    """Build a Zaptec charge history session from (timestamp, energy) details."""
+
+    def make_session(session_id, start, details):
+        return {
+            "Id": session_id,
+            "StartDateTime": start,
+            "EndDateTime": start,
+            "Energy": sum(energy for _, energy in details),
+            "EnergyDetails": [
+                {"Timestamp": timestamp, "Energy": energy}
+                for timestamp, energy in details
+            ],
+        }
+
+    return make_session
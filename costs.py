@@ -0,0 +1,85 @@
+import bisect
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Collection, Iterable, Iterator, Optional
+
+import metrics
+from energy import EnergyColumns
+
+if TYPE_CHECKING:
+    import tariffs
+
+# Energy timestamps mark the end of the metering interval, so the price
+# is taken from the minute before
+PRICE_OFFSET = 60
+
+
+@dataclass(slots=True)
+class Totals:
+    energy: float = 0.0
+    cost: float = 0.0
+
+
+def bucket_totals(
+    columns: EnergyColumns,
+    price_table: "tariffs.PriceTable",
+    buckets: list[tuple[int, int]],
+    chargers: Optional[Collection[int]] = None,
+) -> dict[str, list[Totals]]:
+    """Sum energy and cost per charger into each (first, last) epoch second bucket
+    in a single pass. Buckets may overlap, e.g. a quarter and one of its months.
+    Only the given charger indexes are summed, e.g. those sharing a tariff."""
+    # Split time at every bucket edge, each segment is covered by a fixed set of buckets
+    boundaries = sorted({edge for first, last in buckets for edge in (first, last + 1)})
+    covering = [
+        [i for i, (first, last) in enumerate(buckets) if first <= boundary <= last]
+        for boundary in boundaries
+    ]
+
+    energy_totals = [[0.0] * len(buckets) for _ in columns.charger_ids]
+    cost_totals = [[0.0] * len(buckets) for _ in columns.charger_ids]
+    price_at = price_table.price_at
+    priced = 0
+
+    for timestamp, energy, charger in zip(
+        columns.timestamps, columns.energies, columns.chargers
+    ):
+        if energy == 0 or (chargers is not None and charger not in chargers):
+            continue
+        timestamp -= PRICE_OFFSET
+        segment = bisect.bisect_right(boundaries, timestamp) - 1
+        if segment < 0 or not covering[segment]:
+            continue
+        cost = energy * price_at(timestamp)
+        priced += 1
+        for bucket in covering[segment]:
+            energy_totals[charger][bucket] += energy
+            cost_totals[charger][bucket] += cost
+
+    metrics.count("priced_samples", priced)
+    return {
+        charger_id: [
+            Totals(energy, cost)
+            for energy, cost in zip(energy_totals[i], cost_totals[i])
+        ]
+        for i, charger_id in enumerate(columns.charger_ids)
+        if chargers is None or i in chargers
+    }
+
+
+def interval_costs(
+    rows: Iterable[tuple[int, float]],
+    price_table: "tariffs.PriceTable",
+    first: int,
+    last: int,
+) -> Iterator[tuple[int, float, float, float]]:
+    """Price (timestamp, energy) rows one by one. Yields (timestamp, energy, price,
+    cost) for rows metered between the first and last epoch second."""
+    price_at = price_table.price_at
+    for timestamp, energy in rows:
+        if energy == 0:
+            continue
+        priced_at = timestamp - PRICE_OFFSET
+        if not first <= priced_at <= last:
+            continue
+        price = price_at(priced_at)
+        yield timestamp, energy, price, energy * price
@@ -0,0 +1,47 @@
+import datetime
+from array import array
+from typing import Optional
+
+
+def parse_time(value: Optional[str]) -> Optional[int]:
+    """Parse a Zaptec timestamp, which is UTC when it has no offset, to epoch seconds."""
+    if not value:
+        return None
+    dt = datetime.datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.UTC)
+    return int(dt.timestamp())
+
+
+class EnergyColumns:
+    """Energy details stored column-wise as epoch timestamps, kWh and charger index."""
+
+    def __init__(self):
+        self.timestamps = array("q")
+        self.energies = array("d")
+        self.chargers = array("I")
+        self.charger_ids: list[str] = []
+        self._charger_index: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def charger_index(self, charger_id: str) -> int:
+        index = self._charger_index.get(charger_id)
+        if index is None:
+            index = self._charger_index[charger_id] = len(self.charger_ids)
+            self.charger_ids.append(charger_id)
+        return index
+
+    def append(self, charger_id: str, timestamp: int, energy: float):
+        self.timestamps.append(timestamp)
+        self.energies.append(energy)
+        self.chargers.append(self.charger_index(charger_id))
+
+    def extend_details(self, charger_id: str, energy_details: list[dict]):
+        """Add raw energy details as returned by the Zaptec API."""
+        index = self.charger_index(charger_id)
+        for energy_detail in energy_details:
+            self.timestamps.append(parse_time(energy_detail["Timestamp"]))
+            self.energies.append(energy_detail["Energy"])
+            self.chargers.append(index)
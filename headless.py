@@ -0,0 +1,67 @@
+import re
+import sys
+from typing import Optional
+
+# Console markup used in messages, e.g. [bold] and [/red]
+MARKUP = re.compile(r"\[/?[a-z ]+\]")
+
+
+class QuietConsole:
+    """Plain text console for runs without a terminal, e.g. under cron."""
+
+    def __init__(self, file=None):
+        self.file = file or sys.stdout
+
+    def print(self, *objects, **kwargs):
+        print(*(MARKUP.sub("", str(o)) for o in objects), file=self.file, flush=True)
+
+
+class QuietProgress:
+    """Progress that does not render. Tasks added with a total, like the charger
+    task, are logged every `step` percent, other tasks are ignored."""
+
+    def __init__(self, console: Optional[QuietConsole] = None, step: int = 10):
+        self.console = console
+        self.step = step
+        self.tasks: dict[int, list] = {}
+        self.next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def add_task(self, description: str, total: Optional[float] = None, **fields):
+        task_id = self.next_id
+        self.next_id += 1
+        if total:
+            # Description, total, completed and the last logged step
+            self.tasks[task_id] = [description, total, 0, 0]
+        return task_id
+
+    def update(
+        self,
+        task_id: int,
+        description: Optional[str] = None,
+        completed: Optional[float] = None,
+        advance: Optional[float] = None,
+        **fields,
+    ):
+        task = self.tasks.get(task_id)
+        if task is None:
+            return
+        if completed is not None:
+            task[2] = completed
+        if advance:
+            task[2] += advance
+        reached = int(100 * task[2] / task[1]) // self.step * self.step
+        if reached > task[3] and self.console:
+            task[3] = reached
+            self.console.print(f"{task[0]} {reached}% ({task[2]:g}/{task[1]:g})")
+
+    def advance(self, task_id: int, advance: float = 1):
+        self.update(task_id, advance=advance)
+
+    def remove_task(self, task_id: int):
+        self.tasks.pop(task_id, None)
@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import capture
+import config
+import metrics
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def create_session() -> requests.Session:
+    """Create a keep-alive session with connection pooling and retries on 429/5xx,
+    recording or replaying exchanges if configured."""
+    retry = Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        respect_retry_after_header=True,
+    )
+    pool_size = config.get_http_pool_size()
+    adapter_options = dict(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    replay_path = config.get_replay_path()
+    record_path = config.get_record_path()
+    if replay_path:
+        adapter = capture.ReplayAdapter(capture.get_archive(replay_path))
+    elif record_path:
+        adapter = capture.RecordingAdapter(record_path, **adapter_options)
+    else:
+        adapter = HTTPAdapter(**adapter_options)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+def get_session() -> requests.Session:
+    """Get the shared session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def set_session(session: Optional[requests.Session]):
+    """Replace the shared session, e.g. with a mock in tests."""
+    global _session
+    with _session_lock:
+        _session = session
+
+
+def request(
+    method: str, url: str, session: Optional[requests.Session] = None, **kwargs
+) -> requests.Response:
+    """Send a request on the given session, or the shared one, and record metrics."""
+    kwargs.setdefault("timeout", config.get_http_timeout())
+    started = time.perf_counter()
+    response = (session or get_session()).request(method, url, **kwargs)
+
+    endpoint = urlparse(url).path
+    metrics.observe(
+        "http_request_seconds", time.perf_counter() - started, endpoint=endpoint
+    )
+    metrics.count("http_requests", endpoint=endpoint, status=response.status_code)
+    metrics.count("http_response_bytes", len(response.content), endpoint=endpoint)
+    if getattr(response, "from_cache", False):
+        metrics.count("http_cache_hits", endpoint=endpoint)
+    return response
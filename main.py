@@ -1,158 +1,696 @@
 import fire
 import datetime
-from typing import Tuple
+import fnmatch
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from typing import TYPE_CHECKING, Optional, Tuple
 import zaptec
-import requests_cache
+import capture
+import headless
 import mgrey
+import costs
+import metrics
+import writers
+import store
+import rollups
+import tariffs
+from periods import Period, parse_periods
 import config
-from rich.console import Console
-from rich.progress import (
-    Progress,
-    SpinnerColumn,
-    TextColumn,
-    BarColumn,
-    TaskProgressColumn,
-)
-from rich.status import Status
 
-# Install a filesystem cache
-requests_cache.install_cache(
-    ".http_cache",  # folder name for cached files
-    backend="filesystem",  # use filesystem backend
-    expire_after=3600,  # cache expiration in seconds (1 hour)
-)
+# rich and requests_cache are imported when used, so scripted runs start fast
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.progress import Progress
 
 
-def parse_quarter(quarter: str) -> Tuple[datetime.datetime, datetime.datetime]:
-    current_year = datetime.datetime.now().year
-    local_tz = datetime.datetime.now().astimezone().tzinfo
-
-    if quarter.upper() == "Q1":
-        year = current_year
-        start_date = datetime.datetime(year, 1, 1, tzinfo=local_tz)
-        end_date = datetime.datetime(year, 3, 31, 23, 59, 59, tzinfo=local_tz)
-    elif quarter.upper() == "Q2":
-        year = current_year
-        start_date = datetime.datetime(year, 4, 1, tzinfo=local_tz)
-        end_date = datetime.datetime(year, 6, 30, 23, 59, 59, tzinfo=local_tz)
-    elif quarter.upper() == "Q3":
-        year = current_year
-        start_date = datetime.datetime(year, 7, 1, tzinfo=local_tz)
-        end_date = datetime.datetime(year, 9, 30, 23, 59, 59, tzinfo=local_tz)
-    elif quarter.upper() == "Q4":
-        year = current_year - 1  # Previous year for Q4
-        start_date = datetime.datetime(year, 10, 1, tzinfo=local_tz)
-        end_date = datetime.datetime(year, 12, 31, 23, 59, 59, tzinfo=local_tz)
-    else:
-        raise ValueError(f"Invalid quarter: {quarter}. Must be Q1, Q2, Q3, or Q4")
+def install_cache():
+    """Install a filesystem cache, unless recording or replaying exchanges"""
+    if config.get_record_path() or config.get_replay_path():
+        return
 
-    return start_date, end_date
+    import requests_cache
 
+    requests_cache.install_cache(
+        ".http_cache",  # folder name for cached files
+        backend="filesystem",  # use filesystem backend
+        expire_after=3600,  # cache expiration in seconds (1 hour)
+        urls_expire_after={"mgrey.se": requests_cache.DO_NOT_CACHE},  # see mgrey
+        match_headers=["Authorization"],  # accounts must not see each other's responses
+    )
 
-def main(quarter: str = "Q2", charger="all"):
-    # Check credentials early, before initializing Rich console
+
+def create_console(quiet: bool):
+    if quiet:
+        return headless.QuietConsole()
+    from rich.console import Console
+
+    return Console()
+
+
+def status(console, message: str):
+    """Show a spinner while the block runs, or log the message once when quiet."""
+    if isinstance(console, headless.QuietConsole):
+        console.print(message)
+        return nullcontext()
+    from rich.status import Status
+
+    return Status(message, console=console)
+
+
+def progress_bar(console):
+    if isinstance(console, headless.QuietConsole):
+        return headless.QuietProgress(console)
+    from rich.progress import (
+        Progress,
+        SpinnerColumn,
+        TextColumn,
+        BarColumn,
+        TaskProgressColumn,
+    )
+
+    return Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        console=console,
+    )
+
+
+def process_charger(
+    charger: dict,
+    report_periods: list[Period],
+    progress: "Progress",
+    pricing: tariffs.PricingEngine,
+    sync: bool = True,
+) -> list[Tuple[int, float, float]]:
+    """Get charges, energy and cost of a charger for each period, fetching
+    the union of the periods once."""
+    charger_name = charger.get("Name", "Unknown")
+    start_date = min(start for _, start, _ in report_periods)
+    end_date = max(end for _, _, end in report_periods)
+
+    connection = store.connect()
     try:
-        config.get_zaptec_credentials()
-    except Exception as e:
-        print(f"Error with credentials: {e}")
-        return
+        if sync:
+            # Add progress tracking for API pagination
+            fetch_task = progress.add_task(
+                f"Fetching data for {charger_name}...", total=None
+            )
+            with metrics.phase("sync history"):
+                store.sync_charger(
+                    connection,
+                    charger.get("Id"),
+                    start_date,
+                    end_date,
+                    progress=progress,
+                    task_id=fetch_task,
+                )
+            progress.remove_task(fetch_task)
+
+        # Reuse results of finished periods whose data and pricing have not changed
+        charger_id = charger.get("Id")
+        now = datetime.datetime.now(datetime.UTC)
+        pricing_fingerprint = pricing.fingerprint(charger)
+        fingerprints = [
+            f"{store.data_fingerprint(connection, charger_id, start, end)}:{pricing_fingerprint}"
+            for _, start, end in report_periods
+        ]
+        results = [
+            store.load_result(connection, charger_id, start, end, fingerprint)
+            if end < now
+            else None
+            for (_, start, end), fingerprint in zip(report_periods, fingerprints)
+        ]
+        missing = [i for i, result in enumerate(results) if result is None]
+        metrics.count("result_cache_hits", len(results) - len(missing))
+
+        if missing:
+
+            def price_table(first: int, last: int) -> tariffs.PriceTable:
+                return pricing.charger_table(charger, first, last)
 
-    console = Console()
-    show_charger = charger
+            with metrics.phase("update rollups"):
+                rollups.update(connection, charger_id, pricing_fingerprint, price_table)
 
+            with metrics.phase("calculate costs"):
+                totals = [
+                    rollups.totals(
+                        connection,
+                        charger_id,
+                        int(report_periods[i][1].timestamp()),
+                        int(report_periods[i][2].timestamp()),
+                        price_table,
+                    )
+                    for i in missing
+                ]
+
+            for i, total in zip(missing, totals):
+                _, start, end = report_periods[i]
+                charges_count = store.count_sessions(connection, charger_id, start, end)
+                results[i] = (charges_count, total.energy, total.cost)
+                if end < now:
+                    store.save_result(
+                        connection, charger_id, start, end, fingerprints[i], results[i]
+                    )
+    finally:
+        connection.close()
+
+    return results
+
+
+# Zaptec charger ids are UUIDs, other patterns match charger names
+CHARGER_ID = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE
+)
+
+
+def parse_charger_patterns(charger) -> list[str]:
+    """Split "all", a name, an id or glob pattern, or several of them separated by commas."""
+    if isinstance(charger, (tuple, list)):
+        patterns = [str(pattern).strip() for pattern in charger]
+    else:
+        patterns = [pattern.strip() for pattern in str(charger).split(",")]
+    patterns = [pattern for pattern in patterns if pattern]
+    return ["*"] if patterns in ([], ["all"]) else patterns
+
+
+def list_matching_chargers(
+    patterns: list[str], installation_id: Optional[str] = None
+) -> list[dict]:
+    """List chargers whose name or id matches a pattern, letting Zaptec filter
+    by id, installation or a plain name first."""
+    charger_ids = None
+    name = None
+    if all(CHARGER_ID.match(pattern) for pattern in patterns):
+        charger_ids = patterns
+    elif len(patterns) == 1 and not any(c in patterns[0] for c in "*?["):
+        name = patterns[0]
+
+    connection = store.connect()
     try:
-        start_date, end_date = parse_quarter(quarter)
-        console.print(
-            f"Querying for {quarter} for [bold]{start_date.date().isoformat()}[/bold] - [bold]{end_date.date().isoformat()}[/bold]\n"
+        chargers = store.get_chargers(connection, installation_id, name, charger_ids)
+    finally:
+        connection.close()
+
+    # Zaptec searches names by substring, match them exactly here
+    return [
+        c
+        for c in chargers
+        if any(
+            fnmatch.fnmatchcase(c.get("Name", "Unknown"), pattern)
+            or fnmatch.fnmatchcase(c.get("Id", ""), pattern)
+            for pattern in patterns
         )
+    ]
 
-        with Status("Fetching chargers list...", console=console):
-            chargers = zaptec.list_chargers()
 
-        filtered_chargers = [
-            c
-            for c in chargers
-            if show_charger == "all" or show_charger == c.get("Name", "Unknown")
+# Pricing of a worker process in an account run, set by init_account_worker
+_pricing: Optional[tariffs.PricingEngine] = None
+
+
+def init_account_worker(pricing: tariffs.PricingEngine):
+    global _pricing
+    _pricing = pricing
+    install_cache()
+
+
+def process_account(
+    account: dict,
+    report_periods: list[Period],
+    patterns: list[str],
+    workers: int,
+    sync: bool,
+) -> tuple[list, dict]:
+    """Report the matching chargers of one account in a worker process. Returns
+    (charger, results, error) per charger and the metrics of the run."""
+    zaptec.use_account(account)
+    metrics.reset()
+
+    chargers = list_matching_chargers(patterns, account.get("installation_id"))
+
+    reports = []
+    with (
+        headless.QuietProgress() as progress,
+        ThreadPoolExecutor(max_workers=workers) as executor,
+    ):
+        futures = [
+            executor.submit(
+                process_charger, charger, report_periods, progress, _pricing, sync
+            )
+            for charger in chargers
         ]
+        for charger, future in zip(chargers, futures):
+            try:
+                reports.append((charger, future.result(), None))
+            except Exception as e:
+                reports.append((charger, None, str(e)))
 
-        if not filtered_chargers:
-            console.print(
-                f"[yellow]No chargers found matching '{show_charger}'[/yellow]"
+    return reports, metrics.snapshot()
+
+
+def print_results(
+    console: "Console",
+    charger_name: str,
+    report_periods: list[Period],
+    results: list[Tuple[int, float, float]],
+):
+    console.print(f"\n[bold]{charger_name}[/bold]")
+    for (label, _, _), (charges_count, total_energy, total_cost) in zip(
+        report_periods, results
+    ):
+        if len(report_periods) > 1:
+            console.print(f"[bold]{label}[/bold]")
+        console.print(f"Charges: {charges_count}")
+        console.print(f"Total energy: {total_energy:.2f} kWh")
+        console.print(f"Total cost with hourly rates: {total_cost:.2f} kr")
+        if total_energy:
+            console.print(f"Average price per kWh {total_cost / total_energy:.2f}")
+    console.print("-" * 40)
+
+
+def write_rows(
+    summaries: Optional[writers.Writer],
+    intervals: Optional[writers.Writer],
+    account: Optional[str],
+    charger: dict,
+    report_periods: list[Period],
+    results: list[Tuple[int, float, float]],
+    pricing: tariffs.PricingEngine,
+):
+    """Write the summaries of a charger, and its priced intervals read back from the store."""
+    charger_id = charger.get("Id")
+    charger_name = charger.get("Name", "Unknown")
+    if summaries:
+        for (label, start, end), (charges_count, total_energy, total_cost) in zip(
+            report_periods, results
+        ):
+            summaries.write(
+                {
+                    "account": account,
+                    "charger_id": charger_id,
+                    "charger": charger_name,
+                    "period": label,
+                    "from": start.isoformat(),
+                    "to": end.isoformat(),
+                    "charges": charges_count,
+                    "energy_kwh": total_energy,
+                    "cost_sek": total_cost,
+                }
             )
-            return
-
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(),
-            TaskProgressColumn(),
-            console=console,
-        ) as progress:
-
-            charger_task = progress.add_task(
-                "Processing chargers...", total=len(filtered_chargers)
+
+    if intervals:
+        connection = store.connect()
+        try:
+            for label, start, end in report_periods:
+                first, last = int(start.timestamp()), int(end.timestamp())
+                rows = store.iter_details(connection, charger_id, start, end)
+                for timestamp, energy, price, cost in costs.interval_costs(
+                    rows, pricing.charger_table(charger, first, last), first, last
+                ):
+                    intervals.write(
+                        {
+                            "charger_id": charger_id,
+                            "charger": charger_name,
+                            "period": label,
+                            "timestamp": datetime.datetime.fromtimestamp(
+                                timestamp, datetime.UTC
+                            ).isoformat(),
+                            "energy_kwh": energy,
+                            "price_sek": price,
+                            "cost_sek": cost,
+                        }
+                    )
+        finally:
+            connection.close()
+
+
+def run_accounts(
+    console: "Console",
+    report_periods: list[Period],
+    pricing: tariffs.PricingEngine,
+    patterns: list[str],
+    workers: int,
+    processes: Optional[int],
+    sync: bool,
+    summaries: Optional[writers.Writer] = None,
+    intervals: Optional[writers.Writer] = None,
+):
+    """Spread the accounts over a process pool, each process with its own token
+    and connection pool, and print one consolidated report."""
+    accounts = config.get_accounts()
+    totals = [[0, 0.0, 0.0] for _ in report_periods]
+    reported = []
+
+    with (
+        progress_bar(console) as progress,
+        # Spawn, so no process inherits the connections of this one
+        ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_account_worker,
+            initargs=(pricing,),
+        ) as executor,
+    ):
+        account_task = progress.add_task("Processing accounts...", total=len(accounts))
+        futures = [
+            executor.submit(
+                process_account, account, report_periods, patterns, workers, sync
             )
+            for account in accounts
+        ]
+
+        for account, future in zip(accounts, futures):
+            account_name = account.get("name", account["username"])
+            progress.update(account_task, description=f"Processing {account_name}...")
+            try:
+                with metrics.phase("wait for accounts"):
+                    reports, account_metrics = future.result()
+            except Exception as e:
+                console.print(f"[red]Error processing {account_name}: {e}[/red]")
+                progress.advance(account_task)
+                continue
+            metrics.merge(account_metrics)
 
-            for charger in filtered_chargers:
+            console.print(f"\n[bold underline]{account_name}[/bold underline]")
+            for charger, results, error in reports:
                 charger_name = charger.get("Name", "Unknown")
-                progress.update(
-                    charger_task, description=f"Processing {charger_name}..."
+                if error:
+                    console.print(
+                        f"[red]Error processing {charger_name}: {error}[/red]"
+                    )
+                    continue
+                print_results(console, charger_name, report_periods, results)
+                write_rows(
+                    summaries,
+                    intervals,
+                    account_name,
+                    charger,
+                    report_periods,
+                    results,
+                    pricing,
                 )
+                reported.append(charger)
+                for total, result in zip(totals, results):
+                    for i, value in enumerate(result):
+                        total[i] += value
+            progress.advance(account_task)
+
+    print_results(console, "All accounts", report_periods, totals)
+    return reported
 
-                # Add progress tracking for API pagination
-                fetch_task = progress.add_task(
-                    f"Fetching data for {charger_name}...", total=None
+
+def price_charger_sessions(
+    charger: dict, report_periods: list[Period], pricing: tariffs.PricingEngine
+):
+    """Price the sessions of a charger started within the periods, once per pricing."""
+    connection = store.connect()
+    try:
+        priced = store.price_sessions(
+            connection,
+            charger.get("Id"),
+            min(start for _, start, _ in report_periods),
+            max(end for _, _, end in report_periods),
+            pricing.fingerprint(charger),
+            lambda first, last: pricing.charger_table(charger, first, last),
+        )
+        metrics.count("priced_sessions", priced)
+    finally:
+        connection.close()
+
+
+def print_users(console: "Console", report_periods: list[Period], chargers: list[dict]):
+    charger_ids = [charger.get("Id") for charger in chargers]
+    connection = store.connect()
+    try:
+        for label, start, end in report_periods:
+            console.print(f"\n[bold]Users {label}[/bold]")
+            for user_id, user_name, sessions, energy, cost in store.user_totals(
+                connection, start, end, charger_ids
+            ):
+                console.print(
+                    f"{user_name or user_id or 'Unknown'}: {sessions} charges,"
+                    f" {energy:.2f} kWh, {cost:.2f} kr"
                 )
+        console.print("-" * 40)
+    finally:
+        connection.close()
 
-                energy_details, charges_count = zaptec.get_energy_history(
-                    charger.get("Id"),
-                    start_date,
-                    end_date,
-                    page_size=50,
-                    progress=progress,
-                    task_id=fetch_task,
+
+def write_sessions(
+    writer: writers.Writer, report_periods: list[Period], chargers: list[dict]
+):
+    names = {charger.get("Id"): charger.get("Name", "Unknown") for charger in chargers}
+    connection = store.connect()
+    try:
+        for label, start, end in report_periods:
+            for row in store.query_sessions(connection, start, end, list(names)):
+                session = dict(zip(store.SESSION_FIELDS, row))
+                writer.write(
+                    {
+                        "period": label,
+                        "charger_id": session["charger_id"],
+                        "charger": names[session["charger_id"]],
+                        "session_id": session["session_id"],
+                        "user_id": session["user_id"],
+                        "user_name": session["user_name"],
+                        "token_name": session["token_name"],
+                        "start": datetime.datetime.fromtimestamp(
+                            session["start_time"], datetime.UTC
+                        ).isoformat(),
+                        "end": session["end_time"]
+                        and datetime.datetime.fromtimestamp(
+                            session["end_time"], datetime.UTC
+                        ).isoformat(),
+                        "energy_kwh": session["energy"],
+                        "cost_sek": session["cost"],
+                    }
                 )
+    finally:
+        connection.close()
 
-                progress.remove_task(fetch_task)
 
-                total_cost = 0.0
-                total_energy = 0.0
-                if energy_details:
-                    energy_task = progress.add_task(
-                        f"Calculating costs for {charger_name}...",
-                        total=len(energy_details),
-                    )
+def print_profile(console: "Console", profile):
+    if profile is True or profile == "table":
+        from rich.console import Console
 
-                    for i, energy_detail in enumerate(energy_details):
-                        if energy_detail["Energy"] == 0:
-                            progress.advance(energy_task)
-                            continue
+        # Rendered by rich also when quiet, the table is what was asked for
+        Console().print(metrics.summary_table())
+    elif profile == "json":
+        print(metrics.to_json())
+    elif profile == "openmetrics":
+        print(metrics.to_openmetrics())
+    else:
+        console.print(
+            f"[red]Invalid profile format: {profile}. Must be table, json or openmetrics[/red]"
+        )
 
-                        dt = datetime.datetime.fromisoformat(energy_detail["Timestamp"])
-                        dt = dt - datetime.timedelta(minutes=1)
-                        price = mgrey.get_price(dt)
-                        energy_detail["Price"] = price
-                        cost = energy_detail["Energy"] * price
-                        total_energy += energy_detail["Energy"]
-                        energy_detail["Cost"] = cost
-                        total_cost += cost
 
-                        progress.advance(energy_task)
+def run_chargers(
+    console: "Console",
+    report_periods: list[Period],
+    pricing: tariffs.PricingEngine,
+    patterns: list[str],
+    installation_id: Optional[str],
+    workers: int,
+    sync: bool,
+    summaries: Optional[writers.Writer] = None,
+    intervals: Optional[writers.Writer] = None,
+):
+    with (
+        status(console, "Fetching chargers list..."),
+        metrics.phase("list chargers"),
+    ):
+        filtered_chargers = list_matching_chargers(patterns, installation_id)
 
-                    progress.remove_task(energy_task)
+    if not filtered_chargers:
+        console.print(
+            f"[yellow]No chargers found matching '{','.join(patterns)}'[/yellow]"
+        )
+        return []
+
+    with (
+        progress_bar(console) as progress,
+        ThreadPoolExecutor(max_workers=workers) as executor,
+    ):
+        charger_task = progress.add_task(
+            "Processing chargers...", total=len(filtered_chargers)
+        )
+        reported = []
+
+        # Fetch concurrently, but report in charger order
+        futures = [
+            executor.submit(
+                process_charger,
+                charger,
+                report_periods,
+                progress,
+                pricing,
+                sync,
+            )
+            for charger in filtered_chargers
+        ]
 
-                console.print(f"\n[bold]{charger_name}[/bold]")
-                console.print(f"Charges: {charges_count}")
-                console.print(f"Total energy: {total_energy:.2f} kWh")
-                console.print(f"Total cost with hourly rates: {total_cost:.2f} kr")
-                console.print(f"Average price per kWh {total_cost / total_energy:.2f}")
-                console.print("-" * 40)
+        for charger, future in zip(filtered_chargers, futures):
+            charger_name = charger.get("Name", "Unknown")
+            progress.update(charger_task, description=f"Processing {charger_name}...")
 
+            # A failing charger does not stop the others, a rerun resumes
+            # from what has been stored
+            try:
+                with metrics.phase("wait for chargers"):
+                    results = future.result()
+            except Exception as e:
+                console.print(f"[red]Error processing {charger_name}: {e}[/red]")
                 progress.advance(charger_task)
+                continue
+
+            print_results(console, charger_name, report_periods, results)
+            write_rows(
+                summaries,
+                intervals,
+                None,
+                charger,
+                report_periods,
+                results,
+                pricing,
+            )
+            reported.append(charger)
+            progress.advance(charger_task)
+
+    return reported
+
+
+def main(
+    quarter: str = "Q2",
+    charger="all",
+    workers: int = 4,
+    sync: bool = True,
+    profile=None,
+    periods=None,
+    accounts: bool = False,
+    processes: Optional[int] = None,
+    installation: Optional[str] = None,
+    output: Optional[str] = None,
+    intervals: Optional[str] = None,
+    output_format: Optional[str] = None,
+    quiet: Optional[bool] = None,
+    by_user: bool = False,
+    sessions: Optional[str] = None,
+    record: Optional[str] = None,
+    replay: Optional[str] = None,
+):
+    if record and replay:
+        print("Use either --record or --replay")
+        return
+    # Through the environment, so account worker processes record and replay too
+    if record:
+        capture.start(record)
+        os.environ["CHARGING_COSTS_RECORD"] = record
+    if replay:
+        os.environ["CHARGING_COSTS_REPLAY"] = replay
+
+    # Check credentials early, before initializing Rich console
+    try:
+        if accounts:
+            config.get_accounts()
+        else:
+            config.get_zaptec_credentials()
+    except Exception as e:
+        print(f"Error with credentials: {e}")
+        return
+
+    # Cron and pipes get plain text and coarse progress
+    if quiet is None:
+        quiet = not sys.stdout.isatty()
+    console = create_console(quiet)
+    install_cache()
+
+    try:
+        report_periods = parse_periods(periods if periods is not None else quarter)
+        for label, start_date, end_date in report_periods:
+            console.print(
+                f"Querying for {label} for [bold]{start_date.date().isoformat()}[/bold] - [bold]{end_date.date().isoformat()}[/bold]"
+            )
+        console.print()
+        start_date = min(start for _, start, _ in report_periods)
+        end_date = max(end for _, _, end in report_periods)
+
+        with status(console, "Fetching prices..."), metrics.phase("prices"):
+            pricing = tariffs.PricingEngine()
+            pricing.prefetch(
+                start_date.astimezone(mgrey.TIMEZONE).date(),
+                end_date.astimezone(mgrey.TIMEZONE).date(),
+            )
+
+        patterns = parse_charger_patterns(charger)
+        with ExitStack() as stack:
+            summary_writer = interval_writer = session_writer = None
+            if output:
+                summary_writer = stack.enter_context(
+                    writers.open_writer(output, writers.SUMMARY_FIELDS, output_format)
+                )
+            if intervals:
+                interval_writer = stack.enter_context(
+                    writers.open_writer(
+                        intervals, writers.INTERVAL_FIELDS, output_format
+                    )
+                )
+
+            if sessions:
+                session_writer = stack.enter_context(
+                    writers.open_writer(sessions, writers.SESSION_FIELDS, output_format)
+                )
+
+            if accounts:
+                reported = run_accounts(
+                    console,
+                    report_periods,
+                    pricing,
+                    patterns,
+                    workers,
+                    processes,
+                    sync,
+                    summary_writer,
+                    interval_writer,
+                )
+            else:
+                reported = run_chargers(
+                    console,
+                    report_periods,
+                    pricing,
+                    patterns,
+                    installation,
+                    workers,
+                    sync,
+                    summary_writer,
+                    interval_writer,
+                )
+
+            if by_user or session_writer:
+                with (
+                    status(console, "Pricing sessions..."),
+                    metrics.phase("price sessions"),
+                ):
+                    for reported_charger in reported:
+                        price_charger_sessions(
+                            reported_charger, report_periods, pricing
+                        )
+                if by_user:
+                    print_users(console, report_periods, reported)
+                if session_writer:
+                    write_sessions(session_writer, report_periods, reported)
 
     except Exception as e:
         console.print(f"[red]Error fetching chargers: {e}[/red]")
 
+    if profile:
+        print_profile(console, profile)
+
 
 if __name__ == "__main__":
     fire.Fire(main)
@@ -0,0 +1,168 @@
+import bisect
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from rich.table import Table
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters: dict[tuple[str, tuple], float] = defaultdict(float)
+_histograms: dict[tuple[str, tuple], list[int]] = {}
+_histogram_sums: dict[tuple[str, tuple], float] = defaultdict(float)
+_phases: dict[str, float] = defaultdict(float)
+
+
+def _key(name: str, labels: dict) -> tuple[str, tuple]:
+    return name, tuple(sorted(labels.items()))
+
+
+def count(name: str, amount: float = 1, **labels):
+    """Add to a counter, e.g. count("http_requests", endpoint="/api/chargers")."""
+    with _lock:
+        _counters[_key(name, labels)] += amount
+
+
+def observe(name: str, value: float, **labels):
+    """Record a value, usually a latency in seconds, in a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        if key not in _histograms:
+            _histograms[key] = [0] * (len(BUCKETS) + 1)
+        _histograms[key][bisect.bisect_left(BUCKETS, value)] += 1
+        _histogram_sums[key] += value
+
+
+@contextmanager
+def phase(name: str):
+    """Add the time spent in the block to a phase. Phases run in threads add up."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _phases[name] += elapsed
+
+
+def merge(data: dict):
+    """Add a snapshot, e.g. from a worker process, to the metrics of this process."""
+    with _lock:
+        for counter in data["counters"]:
+            _counters[_key(counter["name"], counter["labels"])] += counter["value"]
+        for histogram in data["histograms"]:
+            key = _key(histogram["name"], histogram["labels"])
+            counts = _histograms.setdefault(key, [0] * (len(BUCKETS) + 1))
+            for i, bucket_count in enumerate(histogram["buckets"].values()):
+                counts[i] += bucket_count
+            _histogram_sums[key] += histogram["sum"]
+        for name, seconds in data["phases"].items():
+            _phases[name] += seconds
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _histogram_sums.clear()
+        _phases.clear()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+def _sample(name: str, labels: str) -> str:
+    return f"{name}{{{labels}}}" if labels else name
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(_counters.items())
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], counts)),
+                    "count": sum(counts),
+                    "sum": _histogram_sums[(name, labels)],
+                }
+                for (name, labels), counts in sorted(_histograms.items())
+            ],
+            "phases": dict(_phases),
+        }
+
+
+def to_json() -> str:
+    return json.dumps(snapshot(), indent=2)
+
+
+def to_openmetrics() -> str:
+    data = snapshot()
+    lines = []
+    typed = set()
+
+    def add_type(name: str, metric_type: str):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {metric_type}")
+
+    for counter in data["counters"]:
+        add_type(counter["name"], "counter")
+        labels = _format_labels(tuple(counter["labels"].items()))
+        lines.append(
+            f"{_sample(counter['name'] + '_total', labels)} {counter['value']}"
+        )
+    for histogram in data["histograms"]:
+        name = histogram["name"]
+        add_type(name, "histogram")
+        labels = _format_labels(tuple(histogram["labels"].items()))
+        separator = "," if labels else ""
+        cumulative = 0
+        for bound, bucket_count in histogram["buckets"].items():
+            cumulative += bucket_count
+            lines.append(
+                f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}'
+            )
+        lines.append(f"{_sample(name + '_count', labels)} {histogram['count']}")
+        lines.append(f"{_sample(name + '_sum', labels)} {histogram['sum']}")
+    for phase_name, seconds in data["phases"].items():
+        add_type("phase_seconds", "counter")
+        lines.append(f'phase_seconds_total{{phase="{phase_name}"}} {seconds}')
+    lines.append("# EOF")
+    return "\n".join(lines)
+
+
+def summary_table() -> "Table":
+    from rich.table import Table
+
+    data = snapshot()
+    table = Table("Metric", "Labels", "Value", title="Profile")
+    for name, seconds in data["phases"].items():
+        table.add_row("phase", name, f"{seconds:.3f} s")
+    for counter in data["counters"]:
+        labels = _format_labels(tuple(counter["labels"].items()))
+        table.add_row(counter["name"], labels, f"{counter['value']:g}")
+    for histogram in data["histograms"]:
+        labels = _format_labels(tuple(histogram["labels"].items()))
+        average = histogram["sum"] / histogram["count"]
+        table.add_row(
+            histogram["name"],
+            labels,
+            f"{histogram['count']} × {average * 1000:.1f} ms avg",
+        )
+    return table
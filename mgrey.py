@@ -1,19 +1,174 @@
 import functools
 import datetime
-import requests
+import json
+import sqlite3
+import zoneinfo
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import fire
+
+import config
+import http_client
+import metrics
+
+# Day-ahead prices are published per local Swedish day
+TIMEZONE = zoneinfo.ZoneInfo("Europe/Stockholm")
+
+# Finest price resolution in seconds, hourly prices are spread over four slots
+SLOT = 900
+
+
+def connect_price_store() -> sqlite3.Connection:
+    path = config.get_price_store_path()
+    config.ensure_config_dir()
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS prices ("
+        " area TEXT NOT NULL, date TEXT NOT NULL, prices TEXT NOT NULL,"
+        " PRIMARY KEY (area, date))"
+    )
+    return connection
+
+
+def load_stored_prices(date: datetime.date, area: str) -> list[dict] | None:
+    with closing(connect_price_store()) as connection:
+        row = connection.execute(
+            "SELECT prices FROM prices WHERE area = ? AND date = ?",
+            (area, date.isoformat()),
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def store_prices(date: datetime.date, body: dict):
+    """Store the prices of all areas in the response."""
+    with closing(connect_price_store()) as connection, connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO prices VALUES (?, ?, ?)",
+            [
+                (area, date.isoformat(), json.dumps(prices))
+                for area, prices in body.items()
+                if isinstance(prices, list) and prices
+            ],
+        )
+
+
+def fetch_prices(date: datetime.date) -> dict:
+    return http_client.request(
+        "GET",
+        f"{config.get_mgrey_base_url()}/espot",
+        params={"format": "json", "date": date.isoformat()},
+    ).json()
+
+
+def is_final(date: datetime.date) -> bool:
+    """Prices for past days never change, today and tomorrow may still be updated."""
+    return date < datetime.datetime.now(TIMEZONE).date()
 
 
 @functools.cache
 def get_prices(date: datetime.date, area="SE3"):
-    return requests.get(
-        "https://mgrey.se/espot", params={"format": "json", "date": date.isoformat()}
-    ).json()[area]
+    final = is_final(date)
+    if final:
+        prices = load_stored_prices(date, area)
+        if prices is not None:
+            metrics.count("price_store_hits")
+            return prices
+
+    metrics.count("price_fetches")
+    body = fetch_prices(date)
+    if final:
+        store_prices(date, body)
+    # Prices for tomorrow are not published until the afternoon
+    return body.get(area) or []
+
+
+def day_bounds(date: datetime.date) -> tuple[int, int]:
+    """Get the UTC epoch start and end of a local day, which is 23 or 25 hours on DST days."""
+    start = datetime.datetime.combine(date, datetime.time(), TIMEZONE)
+    end = datetime.datetime.combine(
+        date + datetime.timedelta(days=1), datetime.time(), TIMEZONE
+    )
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def build_day_index(date: datetime.date, prices: list[dict]) -> dict[int, float]:
+    """Map the UTC epoch start of each slot of the day to its price in SEK/kWh."""
+    if not prices:
+        return {}
+
+    start, end = day_bounds(date)
+    resolution, remainder = divmod(end - start, len(prices))
+    if remainder or resolution % SLOT:
+        raise RuntimeError(f"unexpected number of prices for {date}: {len(prices)}")
+
+    index = {}
+    for i, p in enumerate(prices):
+        price = p["price_sek"] * 0.01
+        interval_start = start + i * resolution
+        for slot in range(interval_start, interval_start + resolution, SLOT):
+            index[slot] = price
+    return index
+
+
+class PriceIndex:
+    """Prices keyed by UTC slot start, loaded a day at a time on first use."""
+
+    def __init__(self, area: str = "SE3"):
+        self.area = area
+        self.prices: dict[int, float] = {}
+        self.loaded_dates: set[datetime.date] = set()
+
+    def add_day(self, date: datetime.date, prices: list[dict]):
+        # A day without published prices stays unloaded until they are added
+        if not prices:
+            return
+        metrics.count("price_index_days")
+        self.prices.update(build_day_index(date, prices))
+        self.loaded_dates.add(date)
+
+    def load(self, date: datetime.date):
+        if date in self.loaded_dates:
+            return
+        self.add_day(date, get_prices(date, self.area))
+
+    def price_at(self, timestamp: int) -> float:
+        slot = timestamp - timestamp % SLOT
+        price = self.prices.get(slot)
+        if price is None:
+            date = datetime.datetime.fromtimestamp(slot, TIMEZONE).date()
+            self.load(date)
+            price = self.prices.get(slot)
+            if price is None:
+                raise RuntimeError(
+                    f"failed to find price for {datetime.datetime.fromtimestamp(slot, TIMEZONE)}"
+                )
+        return price
+
+
+def get_prices_range(
+    start: datetime.date, end: datetime.date, area="SE3", max_workers: int = 8
+) -> PriceIndex:
+    """Fetch all days from start to end, inclusive, in parallel into a price index."""
+    # Prices are published for tomorrow at the latest
+    end = min(end, datetime.datetime.now(TIMEZONE).date() + datetime.timedelta(days=1))
+    dates = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+    index = PriceIndex(area)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        days = executor.map(lambda date: get_prices(date, area), dates)
+        for date, prices in zip(dates, days):
+            index.add_day(date, prices)
+    return index
+
 
+def backfill(year: int, area: str = "SE3"):
+    """Store the prices for every past day of a year."""
+    yesterday = datetime.datetime.now(TIMEZONE).date() - datetime.timedelta(days=1)
+    get_prices_range(
+        datetime.date(year, 1, 1), min(datetime.date(year, 12, 31), yesterday), area
+    )
 
-def get_price(dt: datetime.datetime):
-    prices = get_prices(dt.date())
-    for p in prices:
-        if p["hour"] == dt.hour:
-            return p["price_sek"] * 0.01
 
-    raise RuntimeError(f"failed to find hour {dt.hour}")
+if __name__ == "__main__":
+    fire.Fire({"backfill": backfill})
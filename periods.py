@@ -0,0 +1,95 @@
+import datetime
+import re
+from typing import Tuple
+
+# A report period: label, first and last second
+Period = Tuple[str, datetime.datetime, datetime.datetime]
+
+QUARTER_MONTHS = {1: (1, 3), 2: (4, 6), 3: (7, 9), 4: (10, 12)}
+
+
+def parse_quarter(quarter: str) -> Tuple[datetime.datetime, datetime.datetime]:
+    current_year = datetime.datetime.now().year
+    local_tz = datetime.datetime.now().astimezone().tzinfo
+
+    if quarter.upper() == "Q1":
+        year = current_year
+        start_date = datetime.datetime(year, 1, 1, tzinfo=local_tz)
+        end_date = datetime.datetime(year, 3, 31, 23, 59, 59, tzinfo=local_tz)
+    elif quarter.upper() == "Q2":
+        year = current_year
+        start_date = datetime.datetime(year, 4, 1, tzinfo=local_tz)
+        end_date = datetime.datetime(year, 6, 30, 23, 59, 59, tzinfo=local_tz)
+    elif quarter.upper() == "Q3":
+        year = current_year
+        start_date = datetime.datetime(year, 7, 1, tzinfo=local_tz)
+        end_date = datetime.datetime(year, 9, 30, 23, 59, 59, tzinfo=local_tz)
+    elif quarter.upper() == "Q4":
+        year = current_year - 1  # Previous year for Q4
+        start_date = datetime.datetime(year, 10, 1, tzinfo=local_tz)
+        end_date = datetime.datetime(year, 12, 31, 23, 59, 59, tzinfo=local_tz)
+    else:
+        raise ValueError(f"Invalid quarter: {quarter}. Must be Q1, Q2, Q3, or Q4")
+
+    return start_date, end_date
+
+
+def day_range(
+    first: datetime.date, last: datetime.date
+) -> Tuple[datetime.datetime, datetime.datetime]:
+    local_tz = datetime.datetime.now().astimezone().tzinfo
+    start_date = datetime.datetime.combine(first, datetime.time(), local_tz)
+    end_date = datetime.datetime.combine(last, datetime.time(23, 59, 59), local_tz)
+    return start_date, end_date
+
+
+def month_end(year: int, month: int) -> datetime.date:
+    first_of_next = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return first_of_next - datetime.timedelta(days=1)
+
+
+def parse_period(period) -> Tuple[datetime.datetime, datetime.datetime]:
+    """Parse Q1-Q4, a quarter like 2024-Q3, a month like 2025-05, a year like 2024
+    or a custom range like 2025-01-01..2025-02-15."""
+    period = str(period).strip().upper()
+
+    if re.fullmatch(r"Q[1-4]", period):
+        return parse_quarter(period)
+
+    if match := re.fullmatch(r"(\d{4})-?Q([1-4])", period):
+        year = int(match[1])
+        first_month, last_month = QUARTER_MONTHS[int(match[2])]
+        return day_range(
+            datetime.date(year, first_month, 1), month_end(year, last_month)
+        )
+
+    if match := re.fullmatch(r"(\d{4})-(\d{2})", period):
+        year, month = int(match[1]), int(match[2])
+        return day_range(datetime.date(year, month, 1), month_end(year, month))
+
+    if re.fullmatch(r"\d{4}", period):
+        year = int(period)
+        return day_range(datetime.date(year, 1, 1), datetime.date(year, 12, 31))
+
+    if match := re.fullmatch(r"(\d{4}-\d{2}-\d{2})\.\.(\d{4}-\d{2}-\d{2})", period):
+        return day_range(
+            datetime.date.fromisoformat(match[1]), datetime.date.fromisoformat(match[2])
+        )
+
+    raise ValueError(
+        f"Invalid period: {period}. Must be a quarter (Q2, 2024-Q2), "
+        "a month (2025-05), a year (2024) or a range (2025-01-01..2025-02-15)"
+    )
+
+
+def parse_periods(periods) -> list[Period]:
+    """Parse a comma separated string or a list of periods."""
+    if not isinstance(periods, (list, tuple)):
+        periods = str(periods).split(",")
+
+    parsed = []
+    for period in periods:
+        label = str(period).strip()
+        start_date, end_date = parse_period(label)
+        parsed.append((label, start_date, end_date))
+    return parsed
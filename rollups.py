@@ -0,0 +1,206 @@
+import datetime
+import sqlite3
+from typing import Callable
+
+import costs
+import metrics
+import mgrey
+
+HOUR = 3600
+
+# Resolutions from the coarsest, queries take the coarsest buckets that fit
+RESOLUTIONS = ("month", "day", "hour")
+
+PriceTableFactory = Callable[[int, int], "tariffs.PriceTable"]  # noqa: F821
+
+
+def local_date(timestamp: int) -> datetime.date:
+    return datetime.datetime.fromtimestamp(timestamp, mgrey.TIMEZONE).date()
+
+
+def month_bounds(date: datetime.date) -> tuple[int, int]:
+    """Get the UTC epoch start and end of the local month of a date."""
+    first = date.replace(day=1)
+    next_month = (first + datetime.timedelta(days=32)).replace(day=1)
+    return mgrey.day_bounds(first)[0], mgrey.day_bounds(next_month)[0]
+
+
+def bucket_bounds(resolution: str, timestamp: int) -> tuple[int, int]:
+    """Get the bucket of a resolution that contains the timestamp."""
+    if resolution == "hour":
+        start = timestamp - timestamp % HOUR
+        return start, start + HOUR
+    if resolution == "day":
+        return mgrey.day_bounds(local_date(timestamp))
+    return month_bounds(local_date(timestamp))
+
+
+def split_period(
+    first: int, last: int
+) -> tuple[dict[str, list[int]], list[tuple[int, int]]]:
+    """Cover the epoch seconds from first to last with as few whole months, days
+    and hours as possible. Returns the bucket starts by resolution and the
+    (first, last) fragments left at the edges."""
+    end = last + 1
+    buckets = {resolution: [] for resolution in RESOLUTIONS}
+    fragments = []
+
+    start = first - first % HOUR
+    if start < first:
+        start += HOUR
+        fragments.append((first, min(start, end) - 1))
+    edge = end - end % HOUR
+    if edge >= start and edge < end:
+        fragments.append((edge, last))
+
+    while start < edge:
+        for resolution in RESOLUTIONS:
+            bucket_start, bucket_end = bucket_bounds(resolution, start)
+            if bucket_start == start and bucket_end <= edge:
+                buckets[resolution].append(start)
+                start = bucket_end
+                break
+    return buckets, fragments
+
+
+def detail_totals(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    first: int,
+    last: int,
+    price_table: PriceTableFactory,
+) -> dict[int, costs.Totals]:
+    """Price the raw details metered from first to last, summed per hour."""
+    hours: dict[int, costs.Totals] = {}
+    rows = connection.execute(
+        "SELECT timestamp, energy FROM energy_details"
+        " WHERE charger_id = ? AND timestamp BETWEEN ? AND ?",
+        (charger_id, first + costs.PRICE_OFFSET, last + costs.PRICE_OFFSET),
+    )
+    table = price_table(first, last)
+    priced = 0
+    for timestamp, energy, _, cost in costs.interval_costs(rows, table, first, last):
+        hour = (timestamp - costs.PRICE_OFFSET) // HOUR * HOUR
+        totals = hours.setdefault(hour, costs.Totals())
+        totals.energy += energy
+        totals.cost += cost
+        priced += 1
+    metrics.count("priced_samples", priced)
+    return hours
+
+
+def update(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    fingerprint: str,
+    price_table: PriceTableFactory,
+) -> int:
+    """Compute the rollups of the hours that got new details since the last
+    update, and of their days and months. A new pricing rebuilds all rollups
+    of the charger. Returns the number of hours computed."""
+    state = connection.execute(
+        "SELECT fingerprint FROM rollup_state WHERE charger_id = ?", (charger_id,)
+    ).fetchone()
+    if state is None or state[0] != fingerprint:
+        connection.execute("DELETE FROM rollups WHERE charger_id = ?", (charger_id,))
+        connection.execute(
+            "INSERT OR REPLACE INTO rollup_state VALUES (?, ?)",
+            (charger_id, fingerprint),
+        )
+        dirty = {
+            hour
+            for (hour,) in connection.execute(
+                f"SELECT DISTINCT (timestamp - {costs.PRICE_OFFSET}) / {HOUR} * {HOUR}"
+                " FROM energy_details WHERE charger_id = ?",
+                (charger_id,),
+            )
+        }
+    else:
+        dirty = {
+            hour
+            for (hour,) in connection.execute(
+                "SELECT hour FROM rollup_dirty WHERE charger_id = ?", (charger_id,)
+            )
+        }
+
+    with connection:
+        # Only the hours read, others may have been stored since
+        connection.executemany(
+            "DELETE FROM rollup_dirty WHERE charger_id = ? AND hour = ?",
+            [(charger_id, hour) for hour in dirty],
+        )
+        if not dirty:
+            return 0
+
+        hours = detail_totals(
+            connection, charger_id, min(dirty), max(dirty) + HOUR - 1, price_table
+        )
+        connection.executemany(
+            "DELETE FROM rollups WHERE charger_id = ? AND resolution = 'hour'"
+            " AND bucket_start = ?",
+            [(charger_id, hour) for hour in dirty],
+        )
+        connection.executemany(
+            "INSERT INTO rollups VALUES (?, 'hour', ?, ?, ?)",
+            [
+                (charger_id, hour, totals.energy, totals.cost)
+                for hour, totals in hours.items()
+                if hour in dirty
+            ],
+        )
+
+        # Days are sums of their hours, months of their days
+        for resolution, finer in (("day", "hour"), ("month", "day")):
+            dirty = {bucket_bounds(resolution, bucket)[0] for bucket in dirty}
+            for bucket in dirty:
+                bucket_start, bucket_end = bucket_bounds(resolution, bucket)
+                connection.execute(
+                    "INSERT OR REPLACE INTO rollups SELECT ?, ?, ?,"
+                    " TOTAL(energy), TOTAL(cost) FROM rollups"
+                    " WHERE charger_id = ? AND resolution = ?"
+                    " AND bucket_start >= ? AND bucket_start < ?",
+                    (
+                        charger_id,
+                        resolution,
+                        bucket_start,
+                        charger_id,
+                        finer,
+                        bucket_start,
+                        bucket_end,
+                    ),
+                )
+
+    metrics.count("rollup_hours", len(hours))
+    return len(hours)
+
+
+def totals(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    first: int,
+    last: int,
+    price_table: PriceTableFactory,
+) -> costs.Totals:
+    """Sum energy and cost metered from first to last from the rollups, and the
+    raw details of any partial hours at the edges."""
+    buckets, fragments = split_period(first, last)
+    result = costs.Totals()
+    for resolution, starts in buckets.items():
+        if not starts:
+            continue
+        energy, cost = connection.execute(
+            "SELECT TOTAL(energy), TOTAL(cost) FROM rollups"
+            " WHERE charger_id = ? AND resolution = ?"
+            f" AND bucket_start IN ({','.join('?' * len(starts))})",
+            (charger_id, resolution, *starts),
+        ).fetchone()
+        result.energy += energy
+        result.cost += cost
+    for fragment_first, fragment_last in fragments:
+        for hour in detail_totals(
+            connection, charger_id, fragment_first, fragment_last, price_table
+        ).values():
+            result.energy += hour.energy
+            result.cost += hour.cost
+    metrics.count("rollup_buckets", sum(map(len, buckets.values())))
+    return result
@@ -0,0 +1,255 @@
+"""Long-running service answering cost queries over a local HTTP/JSON API.
+
+uv run python server.py --port=8080 --refresh=900
+curl 'http://127.0.0.1:8080/cost?charger=Charger%201&from=2025-05-01&to=2025-05-31'
+"""
+
+import datetime
+import json
+import sqlite3
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+import fire
+
+import config
+import headless
+import main
+import metrics
+import mgrey
+import store
+import tariffs
+from periods import Period, parse_period
+
+
+class CostServer(ThreadingHTTPServer):
+    """Keeps the token, connection pool, price indexes and store warm, and a
+    background thread pulls new sessions and prices every `refresh_interval` seconds."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        refresh_interval: float = 900,
+        history_start: Optional[datetime.datetime] = None,
+    ):
+        super().__init__((host, port), CostHandler)
+        self.refresh_interval = refresh_interval
+        # Sessions from here on are kept in sync, older ones are fetched when asked for
+        self.history_start = history_start or datetime.datetime(
+            datetime.datetime.now().year, 1, 1, tzinfo=mgrey.TIMEZONE
+        )
+        self.pricing = tariffs.PricingEngine()
+        for area in self.pricing.areas():
+            self.pricing.index(area)
+        self.local = threading.local()
+        self.stopped = threading.Event()
+        self.refreshed = threading.Event()
+        self.refreshed_at: Optional[datetime.datetime] = None
+        self.refresher = threading.Thread(target=self.refresh_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.refresher.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.server_close()
+
+    def connection(self) -> sqlite3.Connection:
+        """Store connection of the calling thread."""
+        if not hasattr(self.local, "connection"):
+            self.local.connection = store.connect()
+        return self.local.connection
+
+    def find_charger(self, name: str) -> Optional[dict]:
+        for charger in store.get_chargers(self.connection()):
+            if name in (charger.get("Id"), charger.get("Name")):
+                return charger
+        return None
+
+    def refresh(self):
+        """Pull the prices of today and tomorrow and new sessions of all chargers."""
+        today = datetime.datetime.now(mgrey.TIMEZONE).date()
+        for date in (today, today + datetime.timedelta(days=1)):
+            # Tomorrow's prices are published in the afternoon
+            self.pricing.add_day(date, mgrey.fetch_prices(date))
+
+        now = datetime.datetime.now(datetime.UTC)
+        for charger in store.get_chargers(self.connection()):
+            store.sync_charger(
+                self.connection(), charger.get("Id"), self.history_start, now
+            )
+        self.refreshed_at = now
+        self.refreshed.set()
+
+    def refresh_forever(self):
+        while not self.stopped.is_set():
+            try:
+                with metrics.phase("refresh"):
+                    self.refresh()
+            except Exception as e:
+                print(f"Refresh failed: {e}", file=sys.stderr)
+            self.stopped.wait(self.refresh_interval)
+
+    def cost(self, charger: dict, period: Period) -> dict:
+        label, start, end = period
+        # The refresher keeps recent history in sync, only fetch what lies before it
+        state = store.get_sync_state(self.connection(), charger.get("Id"))
+        sync = state is None or start.timestamp() < state[0]
+        with metrics.phase("cost query"):
+            ((charges_count, total_energy, total_cost),) = main.process_charger(
+                charger, [period], headless.QuietProgress(), self.pricing, sync
+            )
+        return {
+            "charger_id": charger.get("Id"),
+            "charger": charger.get("Name", "Unknown"),
+            "period": label,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "charges": charges_count,
+            "energy_kwh": total_energy,
+            "cost_sek": total_cost,
+        }
+
+    def price_sessions(self, period: Period) -> list[str]:
+        """Price the sessions of all chargers in the period. Returns their ids."""
+        chargers = store.get_chargers(self.connection())
+        for charger in chargers:
+            main.price_charger_sessions(charger, [period], self.pricing)
+        return [charger.get("Id") for charger in chargers]
+
+    def users(self, period: Period) -> list[dict]:
+        _, start, end = period
+        charger_ids = self.price_sessions(period)
+        return [
+            {
+                "user_id": user_id,
+                "user_name": user_name,
+                "charges": charges_count,
+                "energy_kwh": total_energy,
+                "cost_sek": total_cost,
+            }
+            for user_id, user_name, charges_count, total_energy, total_cost in (
+                store.user_totals(self.connection(), start, end, charger_ids)
+            )
+        ]
+
+    def sessions(self, period: Period, user_id: Optional[str]) -> list[dict]:
+        _, start, end = period
+        charger_ids = self.price_sessions(period)
+        return [
+            dict(zip(store.SESSION_FIELDS, row))
+            for row in store.query_sessions(
+                self.connection(), start, end, charger_ids, user_id
+            )
+        ]
+
+
+def parse_query_period(query: dict) -> Period:
+    """Take a period like 2025-Q2, or from and to dates."""
+    if "period" in query:
+        label = query["period"][0]
+    elif "from" in query and "to" in query:
+        label = f"{query['from'][0]}..{query['to'][0]}"
+    else:
+        raise ValueError("Either period, or from and to, is required")
+    start_date, end_date = parse_period(label)
+    return label, start_date, end_date
+
+
+class CostHandler(BaseHTTPRequestHandler):
+    server: CostServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status: int, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        metrics.count("api_requests", endpoint=url.path)
+
+        try:
+            if url.path == "/cost":
+                if "charger" not in query:
+                    raise ValueError("charger is required")
+                charger = self.server.find_charger(query["charger"][0])
+                if charger is None:
+                    return self.respond(404, {"error": "Unknown charger"})
+                period = parse_query_period(query)
+                return self.respond(200, self.server.cost(charger, period))
+            if url.path == "/users":
+                return self.respond(200, self.server.users(parse_query_period(query)))
+            if url.path == "/sessions":
+                user_id = query["user"][0] if "user" in query else None
+                return self.respond(
+                    200, self.server.sessions(parse_query_period(query), user_id)
+                )
+            if url.path == "/chargers":
+                chargers = store.get_chargers(self.server.connection())
+                return self.respond(
+                    200,
+                    [
+                        {"id": c.get("Id"), "name": c.get("Name", "Unknown")}
+                        for c in chargers
+                    ],
+                )
+            if url.path == "/health":
+                refreshed_at = self.server.refreshed_at
+                return self.respond(
+                    200,
+                    {
+                        "refreshed_at": refreshed_at and refreshed_at.isoformat(),
+                        "price_days": {
+                            area: len(index.loaded_dates)
+                            for area, index in self.server.pricing.indexes.items()
+                        },
+                    },
+                )
+            if url.path == "/metrics":
+                payload = metrics.to_openmetrics().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/openmetrics-text")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+            return self.respond(404, {"error": "Not found"})
+        except ValueError as e:
+            return self.respond(400, {"error": str(e)})
+        except Exception as e:
+            return self.respond(500, {"error": str(e)})
+
+
+def serve(port: int = 8080, host: str = "127.0.0.1", refresh: float = 900):
+    """Serve cost queries, refreshing sessions and prices every `refresh` seconds."""
+    config.get_zaptec_credentials()
+    with CostServer(host, port, refresh) as server:
+        print(f"Serving cost queries on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    fire.Fire(serve)
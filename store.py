@@ -0,0 +1,553 @@
+import datetime
+import json
+import sqlite3
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+
+import config
+import costs
+import zaptec
+from energy import parse_time
+
+if TYPE_CHECKING:
+    from rich.progress import Progress
+
+    import tariffs
+
+# Sessions that were still running at the last sync are only reported once
+# they have ended, so each delta sync re-reads this much before the watermark
+SYNC_OVERLAP = datetime.timedelta(days=1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    charger_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    end_time INTEGER,
+    energy REAL,
+    user_id TEXT,
+    user_name TEXT,
+    token_name TEXT,
+    PRIMARY KEY (charger_id, session_id)
+);
+CREATE INDEX IF NOT EXISTS sessions_start_time ON sessions (charger_id, start_time);
+CREATE TABLE IF NOT EXISTS session_costs (
+    charger_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    energy REAL NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (charger_id, session_id)
+);
+CREATE TABLE IF NOT EXISTS energy_details (
+    charger_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    energy REAL NOT NULL,
+    PRIMARY KEY (charger_id, session_id, timestamp)
+);
+CREATE INDEX IF NOT EXISTS energy_details_timestamp ON energy_details (charger_id, timestamp);
+CREATE TABLE IF NOT EXISTS sync_state (
+    charger_id TEXT PRIMARY KEY,
+    synced_from INTEGER NOT NULL,
+    synced_to INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_checkpoints (
+    charger_id TEXT PRIMARY KEY,
+    range_from INTEGER NOT NULL,
+    range_to INTEGER NOT NULL,
+    resume_to INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    charger_id TEXT NOT NULL,
+    period_from INTEGER NOT NULL,
+    period_to INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    charges INTEGER NOT NULL,
+    energy REAL NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (charger_id, period_from, period_to)
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    charger_id TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    energy REAL NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (charger_id, resolution, bucket_start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_state (
+    charger_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_dirty (
+    charger_id TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    PRIMARY KEY (charger_id, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS charger_lists (
+    query TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    chargers TEXT NOT NULL
+);
+"""
+
+
+# Columns added to existing stores, with the indexes that use them
+MIGRATIONS = {
+    "sessions": {"user_id": "TEXT", "user_name": "TEXT", "token_name": "TEXT"},
+}
+MIGRATED_INDEXES = """
+CREATE INDEX IF NOT EXISTS sessions_user ON sessions (user_id, start_time);
+CREATE INDEX IF NOT EXISTS sessions_time ON sessions (start_time);
+"""
+
+
+def migrate(connection: sqlite3.Connection):
+    # Checkpoints by page number are dropped, their ranges were never marked synced
+    # so the next sync fetches them again
+    checkpoint_columns = {
+        row[1] for row in connection.execute("PRAGMA table_info(sync_checkpoints)")
+    }
+    if "next_page" in checkpoint_columns:
+        connection.execute("DROP TABLE sync_checkpoints")
+        connection.executescript(SCHEMA)
+    for table, columns in MIGRATIONS.items():
+        existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+        for name, column_type in columns.items():
+            if name not in existing:
+                connection.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"
+                )
+    connection.executescript(MIGRATED_INDEXES)
+
+
+def connect(path=None) -> sqlite3.Connection:
+    """Open the store, creating it if needed. Use one connection per thread."""
+    path = path or config.get_store_path()
+    if str(path) != ":memory:":
+        config.ensure_config_dir()
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    migrate(connection)
+    return connection
+
+
+def session_id(session: dict) -> str:
+    return session.get("Id") or session["StartDateTime"]
+
+
+def save_sessions(connection: sqlite3.Connection, charger_id: str, sessions: list):
+    with connection:
+        for session in sessions:
+            sid = session_id(session)
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions (charger_id, session_id, start_time,"
+                " end_time, energy, user_id, user_name, token_name)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    charger_id,
+                    sid,
+                    parse_time(session["StartDateTime"]),
+                    parse_time(session.get("EndDateTime")),
+                    session.get("Energy"),
+                    session.get("UserId"),
+                    session.get("UserFullName"),
+                    session.get("TokenName"),
+                ),
+            )
+            # A running session gets new details, its cost is computed again
+            connection.execute(
+                "DELETE FROM session_costs WHERE charger_id = ? AND session_id = ?",
+                (charger_id, sid),
+            )
+            details = [
+                (charger_id, sid, parse_time(d["Timestamp"]), d["Energy"])
+                for d in session.get("EnergyDetails", [])
+            ]
+            connection.executemany(
+                "INSERT OR REPLACE INTO energy_details VALUES (?, ?, ?, ?)", details
+            )
+            # Hours whose rollups must be computed again, see rollups.update
+            connection.executemany(
+                "INSERT OR IGNORE INTO rollup_dirty VALUES (?, ?)",
+                {
+                    (charger_id, (timestamp - costs.PRICE_OFFSET) // 3600 * 3600)
+                    for _, _, timestamp, _ in details
+                },
+            )
+
+
+def get_sync_state(
+    connection: sqlite3.Connection, charger_id: str
+) -> Optional[tuple[int, int]]:
+    return connection.execute(
+        "SELECT synced_from, synced_to FROM sync_state WHERE charger_id = ?",
+        (charger_id,),
+    ).fetchone()
+
+
+def extend_sync_state(
+    connection: sqlite3.Connection, charger_id: str, from_ts: int, to_ts: int
+):
+    with connection:
+        connection.execute(
+            "INSERT INTO sync_state VALUES (?, ?, ?) ON CONFLICT (charger_id) DO UPDATE"
+            " SET synced_from = MIN(synced_from, excluded.synced_from),"
+            " synced_to = MAX(synced_to, excluded.synced_to)",
+            (charger_id, from_ts, to_ts),
+        )
+
+
+def sync_range(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    from_ts: int,
+    to_ts: int,
+    resume_to: Optional[int] = None,
+    progress: Optional["Progress"] = None,
+    task_id: Optional[int] = None,
+) -> int:
+    """Fetch a range page by page, checkpointing the oldest start stored so an
+    interrupted sync resumes with only the sessions that started before it."""
+    fetched = 0
+    watermark = to_ts if resume_to is None else resume_to
+    # Save page by page, so memory stays flat for long periods. Pages are newest
+    # first and shift when sessions end, so resume by start time and not by page.
+    for sessions in zaptec.iter_session_pages(
+        charger_id,
+        datetime.datetime.fromtimestamp(from_ts, datetime.UTC),
+        datetime.datetime.fromtimestamp(watermark, datetime.UTC),
+        page_size=50,
+        progress=progress,
+        task_id=task_id,
+    ):
+        save_sessions(connection, charger_id, sessions)
+        fetched += len(sessions)
+        for session in sessions:
+            watermark = min(watermark, parse_time(session["StartDateTime"]))
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sync_checkpoints VALUES (?, ?, ?, ?)",
+                (charger_id, from_ts, to_ts, watermark),
+            )
+
+    extend_sync_state(connection, charger_id, from_ts, to_ts)
+    with connection:
+        connection.execute(
+            "DELETE FROM sync_checkpoints WHERE charger_id = ?", (charger_id,)
+        )
+    return fetched
+
+
+def sync_charger(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+    progress: Optional["Progress"] = None,
+    task_id: Optional[int] = None,
+) -> int:
+    """Fetch only the part of the period not already in the store. Returns sessions fetched."""
+    fetched = 0
+
+    # Finish a sync that was interrupted first, it is adjacent to the synced range
+    checkpoint = connection.execute(
+        "SELECT range_from, range_to, resume_to FROM sync_checkpoints"
+        " WHERE charger_id = ?",
+        (charger_id,),
+    ).fetchone()
+    if checkpoint:
+        range_from, range_to, resume_to = checkpoint
+        fetched += sync_range(
+            connection, charger_id, range_from, range_to, resume_to, progress, task_id
+        )
+
+    now = datetime.datetime.now(datetime.UTC)
+    to_date = min(to_date, now)
+    from_ts, to_ts = int(from_date.timestamp()), int(to_date.timestamp())
+
+    state = get_sync_state(connection, charger_id)
+    if state is None:
+        ranges = [(from_ts, to_ts)]
+    else:
+        synced_from, synced_to = state
+        ranges = []
+        if from_ts < synced_from:
+            ranges.append((from_ts, synced_from))
+        if to_ts > synced_to:
+            overlap = int(SYNC_OVERLAP.total_seconds())
+            ranges.append((synced_to - overlap, to_ts))
+
+    for range_from, range_to in ranges:
+        fetched += sync_range(
+            connection, charger_id, range_from, range_to, None, progress, task_id
+        )
+    return fetched
+
+
+def count_sessions(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+) -> int:
+    (count,) = connection.execute(
+        "SELECT COUNT(*) FROM sessions"
+        " WHERE charger_id = ? AND start_time BETWEEN ? AND ?",
+        (charger_id, int(from_date.timestamp()), int(to_date.timestamp())),
+    ).fetchone()
+    return count
+
+
+def iter_details(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+) -> sqlite3.Cursor:
+    """Stream (timestamp, energy) of details metered within the period, in time order."""
+    # Details are stamped at the end of their interval
+    return connection.execute(
+        "SELECT timestamp, energy FROM energy_details"
+        " WHERE charger_id = ? AND timestamp BETWEEN ? AND ?"
+        " ORDER BY timestamp",
+        (
+            charger_id,
+            int(from_date.timestamp()),
+            int(to_date.timestamp()) + costs.PRICE_OFFSET,
+        ),
+    )
+
+
+def data_fingerprint(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+) -> str:
+    """Summarize the stored data of a period, it changes when any detail changes."""
+    row = connection.execute(
+        "SELECT COUNT(*), MAX(timestamp), TOTAL(energy), TOTAL(timestamp * energy)"
+        " FROM energy_details WHERE charger_id = ? AND timestamp BETWEEN ? AND ?",
+        (
+            charger_id,
+            int(from_date.timestamp()),
+            int(to_date.timestamp()) + costs.PRICE_OFFSET,
+        ),
+    ).fetchone()
+    (sessions,) = connection.execute(
+        "SELECT COUNT(*) FROM sessions"
+        " WHERE charger_id = ? AND start_time BETWEEN ? AND ?",
+        (charger_id, int(from_date.timestamp()), int(to_date.timestamp())),
+    ).fetchone()
+    return ":".join(map(str, (*row, sessions)))
+
+
+def load_result(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+    fingerprint: str,
+) -> Optional[tuple[int, float, float]]:
+    return connection.execute(
+        "SELECT charges, energy, cost FROM results WHERE charger_id = ?"
+        " AND period_from = ? AND period_to = ? AND fingerprint = ?",
+        (
+            charger_id,
+            int(from_date.timestamp()),
+            int(to_date.timestamp()),
+            fingerprint,
+        ),
+    ).fetchone()
+
+
+def save_result(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+    fingerprint: str,
+    result: tuple[int, float, float],
+):
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                charger_id,
+                int(from_date.timestamp()),
+                int(to_date.timestamp()),
+                fingerprint,
+                *result,
+            ),
+        )
+
+
+def get_chargers(
+    connection: sqlite3.Connection,
+    installation_id: Optional[str] = None,
+    name: Optional[str] = None,
+    charger_ids: Optional[list[str]] = None,
+    max_age: Optional[float] = None,
+) -> list[dict]:
+    """List chargers, reusing a listing of the same account and filters that is
+    younger than max_age seconds."""
+    if max_age is None:
+        max_age = config.get_charger_cache_ttl()
+    query = json.dumps(
+        [
+            zaptec.get_base_url(),
+            zaptec.get_username(),
+            installation_id,
+            name,
+            sorted(charger_ids or []),
+        ]
+    )
+
+    row = connection.execute(
+        "SELECT fetched_at, chargers FROM charger_lists WHERE query = ?", (query,)
+    ).fetchone()
+    if row and time.time() - row[0] < max_age:
+        return json.loads(row[1])
+
+    chargers = zaptec.list_chargers(installation_id, name, charger_ids)
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO charger_lists VALUES (?, ?, ?)",
+            (query, time.time(), json.dumps(chargers)),
+        )
+    return chargers
+
+
+def known_chargers(connection: sqlite3.Connection) -> dict[str, dict]:
+    """Get the chargers of all stored listings by id."""
+    chargers = {}
+    for (listing,) in connection.execute("SELECT chargers FROM charger_lists"):
+        for charger in json.loads(listing):
+            chargers[charger["Id"]] = charger
+    return chargers
+
+
+def price_sessions(
+    connection: sqlite3.Connection,
+    charger_id: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+    fingerprint: str,
+    price_table: Callable[[int, int], "tariffs.PriceTable"],
+) -> int:
+    """Store the energy and cost of sessions started within the period that are
+    not priced with this pricing fingerprint yet. Returns the number priced."""
+    missing = [
+        session_id
+        for (session_id,) in connection.execute(
+            "SELECT s.session_id FROM sessions s LEFT JOIN session_costs c"
+            " ON c.charger_id = s.charger_id AND c.session_id = s.session_id"
+            " AND c.fingerprint = ?"
+            " WHERE s.charger_id = ? AND s.start_time BETWEEN ? AND ?"
+            " AND c.session_id IS NULL",
+            (
+                fingerprint,
+                charger_id,
+                int(from_date.timestamp()),
+                int(to_date.timestamp()),
+            ),
+        )
+    ]
+    if not missing:
+        return 0
+
+    # One price table covers the details of all the sessions
+    first, last = connection.execute(
+        f"SELECT MIN(d.timestamp) - {costs.PRICE_OFFSET}, MAX(d.timestamp) FROM sessions s"
+        " JOIN energy_details d"
+        " ON d.charger_id = s.charger_id AND d.session_id = s.session_id"
+        " WHERE s.charger_id = ? AND s.start_time BETWEEN ? AND ?",
+        (charger_id, int(from_date.timestamp()), int(to_date.timestamp())),
+    ).fetchone()
+    table = price_table(first, last) if first is not None else None
+
+    with connection:
+        for session_id in missing:
+            energy = cost = 0.0
+            if table is not None:
+                rows = connection.execute(
+                    "SELECT timestamp, energy FROM energy_details"
+                    " WHERE charger_id = ? AND session_id = ?",
+                    (charger_id, session_id),
+                )
+                for _, detail_energy, _, detail_cost in costs.interval_costs(
+                    rows, table, first, last
+                ):
+                    energy += detail_energy
+                    cost += detail_cost
+            connection.execute(
+                "INSERT OR REPLACE INTO session_costs VALUES (?, ?, ?, ?, ?)",
+                (charger_id, session_id, fingerprint, energy, cost),
+            )
+    return len(missing)
+
+
+SESSION_FIELDS = [
+    "charger_id",
+    "session_id",
+    "user_id",
+    "user_name",
+    "token_name",
+    "start_time",
+    "end_time",
+    "energy",
+    "cost",
+]
+
+
+def query_sessions(
+    connection: sqlite3.Connection,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+    charger_ids: Optional[list[str]] = None,
+    user_id: Optional[str] = None,
+) -> sqlite3.Cursor:
+    """Stream priced sessions started within the period, by start time, as rows of
+    SESSION_FIELDS. Sessions are found by the user or time index."""
+    sql = (
+        "SELECT s.charger_id, s.session_id, s.user_id, s.user_name, s.token_name,"
+        " s.start_time, s.end_time, c.energy, c.cost"
+        " FROM sessions s JOIN session_costs c"
+        " ON c.charger_id = s.charger_id AND c.session_id = s.session_id"
+        " WHERE s.start_time BETWEEN ? AND ?"
+    )
+    params = [int(from_date.timestamp()), int(to_date.timestamp())]
+    if user_id is not None:
+        sql += " AND s.user_id = ?"
+        params.append(user_id)
+    if charger_ids is not None:
+        sql += f" AND s.charger_id IN ({','.join('?' * len(charger_ids))})"
+        params.extend(charger_ids)
+    return connection.execute(sql + " ORDER BY s.start_time", params)
+
+
+def user_totals(
+    connection: sqlite3.Connection,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+    charger_ids: Optional[list[str]] = None,
+) -> list[tuple[Optional[str], Optional[str], int, float, float]]:
+    """Sum the priced sessions started within the period per user. Returns
+    (user id, user name, sessions, energy, cost) by descending cost."""
+    sql = (
+        "SELECT s.user_id, MAX(s.user_name), COUNT(*), TOTAL(c.energy), TOTAL(c.cost)"
+        " FROM sessions s JOIN session_costs c"
+        " ON c.charger_id = s.charger_id AND c.session_id = s.session_id"
+        " WHERE s.start_time BETWEEN ? AND ?"
+    )
+    params = [int(from_date.timestamp()), int(to_date.timestamp())]
+    if charger_ids is not None:
+        sql += f" AND s.charger_id IN ({','.join('?' * len(charger_ids))})"
+        params.extend(charger_ids)
+    return connection.execute(
+        sql + " GROUP BY s.user_id ORDER BY TOTAL(c.cost) DESC", params
+    ).fetchall()
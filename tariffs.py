@@ -0,0 +1,211 @@
+import datetime
+import hashlib
+import math
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Optional
+
+import config
+import mgrey
+
+
+@dataclass(frozen=True)
+class TimeOfUse:
+    """A fee in SEK/kWh for local hours from the first up to the last, on the
+    given weekdays (Monday is 0) and months."""
+
+    fee: float
+    hours: tuple[int, int] = (0, 24)
+    weekdays: tuple[int, ...] = (0, 1, 2, 3, 4, 5, 6)
+    months: tuple[int, ...] = tuple(range(1, 13))
+
+    def applies(self, local: datetime.datetime) -> bool:
+        return (
+            self.hours[0] <= local.hour < self.hours[1]
+            and local.weekday() in self.weekdays
+            and local.month in self.months
+        )
+
+
+@dataclass(frozen=True)
+class Tariff:
+    """Fees in SEK/kWh added to the spot price, with VAT on the total."""
+
+    name: str
+    grid_fee: float = 0.0
+    energy_tax: float = 0.0
+    markup: float = 0.0
+    vat: float = 0.0
+    time_of_use: tuple[TimeOfUse, ...] = ()
+
+    @classmethod
+    def from_config(cls, name: str, data: dict) -> "Tariff":
+        return cls(
+            name,
+            grid_fee=float(data.get("grid_fee", 0.0)),
+            energy_tax=float(data.get("energy_tax", 0.0)),
+            markup=float(data.get("markup", 0.0)),
+            vat=float(data.get("vat", 0.0)),
+            time_of_use=tuple(
+                TimeOfUse(
+                    float(rule["fee"]),
+                    tuple(rule.get("hours", (0, 24))),
+                    tuple(rule.get("weekdays", range(7))),
+                    tuple(rule.get("months", range(1, 13))),
+                )
+                for rule in data.get("time_of_use", [])
+            ),
+        )
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha1(repr(self).encode()).hexdigest()[:12]
+
+    def effective_price(self, spot: float, local: datetime.datetime) -> float:
+        fees = self.grid_fee + self.energy_tax + self.markup
+        fees += sum(rule.fee for rule in self.time_of_use if rule.applies(local))
+        return (spot + fees) * (1 + self.vat)
+
+
+# The spot price as is
+SPOT = Tariff("spot")
+
+
+class PriceTable:
+    """Effective prices of consecutive slots, so a price is one offset lookup."""
+
+    def __init__(self, start: int, prices: array):
+        self.start = start
+        self.prices = prices
+
+    @property
+    def end(self) -> int:
+        """The last epoch second with a price."""
+        return self.start + len(self.prices) * mgrey.SLOT - 1
+
+    def price_at(self, timestamp: int) -> float:
+        i = (timestamp - self.start) // mgrey.SLOT
+        if 0 <= i < len(self.prices):
+            price = self.prices[i]
+            # Slots of days without prices are NaN
+            if price == price:
+                return price
+        raise RuntimeError(
+            f"failed to find price for {datetime.datetime.fromtimestamp(timestamp, mgrey.TIMEZONE)}"
+        )
+
+
+def build_table(
+    index: mgrey.PriceIndex, tariff: Tariff, first: int, last: int
+) -> PriceTable:
+    """Apply a tariff to every slot from the first to the last epoch second. Slots
+    without a spot price only fail when something metered in them is priced."""
+    # Nothing is metered after now, and tomorrow's prices are published in the afternoon
+    last = min(last, int(time.time()))
+    start = first - first % mgrey.SLOT
+
+    prices = array("d")
+    for slot in range(start, last + 1, mgrey.SLOT):
+        try:
+            spot = index.price_at(slot)
+        except RuntimeError:
+            prices.append(math.nan)
+            continue
+        if tariff.time_of_use:
+            local = datetime.datetime.fromtimestamp(slot, mgrey.TIMEZONE)
+            prices.append(tariff.effective_price(spot, local))
+        else:
+            prices.append(tariff.effective_price(spot, None))
+    return PriceTable(start, prices)
+
+
+class PricingEngine:
+    """Resolves the price area and tariff of chargers and builds one effective
+    price table per area, tariff and period."""
+
+    def __init__(self):
+        self.default_area = config.get_price_area()
+        self.default_tariff = config.get_default_tariff()
+        self.tariffs = {
+            SPOT.name: SPOT,
+            **{
+                name: Tariff.from_config(name, data)
+                for name, data in config.get_tariffs().items()
+            },
+        }
+        self.charger_pricing = config.get_charger_pricing()
+        self.indexes: dict[str, mgrey.PriceIndex] = {}
+        self.tables: dict[tuple, PriceTable] = {}
+        # Charger threads and the service's refresher share the engine
+        self.lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Account worker processes get a copy without the lock
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def areas(self) -> set[str]:
+        """Areas of the configured chargers, prefetched before chargers are listed."""
+        return {self.default_area} | {
+            pricing["area"]
+            for pricing in self.charger_pricing.values()
+            if "area" in pricing
+        }
+
+    def prefetch(self, first: datetime.date, last: datetime.date):
+        for area in self.areas():
+            self.indexes[area] = mgrey.get_prices_range(first, last, area)
+
+    def index(self, area: str) -> mgrey.PriceIndex:
+        with self.lock:
+            if area not in self.indexes:
+                self.indexes[area] = mgrey.PriceIndex(area)
+            return self.indexes[area]
+
+    def resolve(self, charger: dict) -> tuple[str, Tariff]:
+        """Pricing is configured per charger id, charger name or installation id."""
+        pricing = {}
+        for key in ("Id", "Name", "InstallationId"):
+            if charger.get(key) in self.charger_pricing:
+                pricing = self.charger_pricing[charger[key]]
+                break
+        area = pricing.get("area", self.default_area)
+        tariff_name = pricing.get("tariff", self.default_tariff)
+        if tariff_name not in self.tariffs:
+            raise ValueError(f"Unknown tariff: {tariff_name}")
+        return area, self.tariffs[tariff_name]
+
+    def fingerprint(self, charger: dict) -> str:
+        area, tariff = self.resolve(charger)
+        return f"{area}:{tariff.fingerprint}"
+
+    def table(self, area: str, tariff: Tariff, first: int, last: int) -> PriceTable:
+        key = (area, tariff.name, first, last)
+        with self.lock:
+            table = self.tables.get(key)
+        # Tables end when they are built, a period still running needs a longer one
+        if table is None or table.end < min(last, int(time.time())):
+            table = build_table(self.index(area), tariff, first, last)
+            with self.lock:
+                self.tables[key] = table
+        return table
+
+    def charger_table(self, charger: dict, first: int, last: int) -> PriceTable:
+        area, tariff = self.resolve(charger)
+        return self.table(area, tariff, first, last)
+
+    def add_day(self, date: datetime.date, body: dict):
+        """Update the indexes with new prices, e.g. tomorrow's, and drop stale tables."""
+        with self.lock:
+            for area, index in self.indexes.items():
+                prices: Optional[list] = body.get(area)
+                if prices:
+                    index.add_day(date, prices)
+            self.tables.clear()
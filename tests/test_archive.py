@@ -0,0 +1,118 @@
+import archive
+import costs
+import store
+from energy import EnergyColumns
+
+
+class FlatPricing:
+    """Every charger has the same price of 2 kr/kWh."""
+
+    def fingerprint(self, charger):
+        return "flat"
+
+    def charger_table(self, charger, first, last):
+        return self
+
+    def price_at(self, timestamp):
+        return 2.0
+
+
+def details(day, hours):
+    return [(f"2025-03-{day:02}T{hour:02}:15:00+00:00", 1.0 + hour) for hour in hours]
+
+
+def test_append_new_details(connection, tmp_path, monkeypatch, make_session):
+    monkeypatch.setattr(archive, "BLOCK_ROWS", 4)
+    store.save_sessions(
+        connection,
+        "c1",
+        [make_session("s1", "2025-03-01T00:00:00", details(1, range(6)))],
+    )
+    store.save_sessions(
+        connection,
+        "c2",
+        [make_session("s2", "2025-03-01T00:00:00", details(1, [3, 9]))],
+    )
+    assert archive.append_new_details(archive.Archive(tmp_path), connection) == 8
+
+    # Details stored before or after the archived ones of a charger are appended,
+    # e.g. when an earlier period is reported
+    store.save_sessions(
+        connection, "c1", [make_session("s3", "2025-03-20T00:00:00", details(20, [1]))]
+    )
+    store.save_sessions(
+        connection,
+        "c1",
+        [
+            make_session(
+                "s0", "2025-02-20T00:00:00", [("2025-02-20T01:15:00+00:00", 4.0)]
+            )
+        ],
+    )
+    reopened = archive.Archive(tmp_path)
+    assert archive.append_new_details(reopened, connection) == 2
+    assert archive.append_new_details(reopened, connection) == 0
+
+    reopened = archive.Archive(tmp_path)
+    assert reopened.rows == 10
+    assert reopened.charger_ids == ["c1", "c2"]
+    assert len(reopened.blocks) == 3 * 2
+    rows = [
+        (reopened.charger_ids[charger], timestamp, energy)
+        for columns in reopened.window(0, 2**40)
+        for timestamp, energy, charger in zip(
+            columns.timestamps, columns.energies, columns.chargers
+        )
+    ]
+    assert sorted(rows) == sorted(
+        connection.execute(
+            "SELECT charger_id, timestamp, energy FROM energy_details"
+        ).fetchall()
+    )
+
+    # The backfilled and the latest detail share the last block, it is the only
+    # one in the window of the latest
+    last = max(timestamp for _, timestamp, _ in rows)
+    assert [len(columns) for columns in reopened.window(last, last)] == [2]
+
+
+def test_interrupted_append_is_ignored(tmp_path):
+    columns = EnergyColumns()
+    columns.append("c1", 1000, 1.5)
+    archive.Archive(tmp_path).append(columns)
+    with open(tmp_path / "energies", "ab") as f:
+        f.write(b"partial")
+
+    reopened = archive.Archive(tmp_path)
+    columns = EnergyColumns()
+    columns.append("c1", 2000, 2.5)
+    reopened.append(columns)
+    (view,) = reopened.window(0, 3000)
+    assert list(view.energies) == [1.5, 2.5]
+
+
+def test_bucket_totals_match_store(connection, tmp_path, make_session):
+    store.save_sessions(
+        connection,
+        "c1",
+        [
+            make_session("s1", "2025-03-01T00:00:00", details(day, [8, 20]))
+            for day in (1, 2)
+        ],
+    )
+    store.save_sessions(
+        connection, "c2", [make_session("s2", "2025-03-02T00:00:00", details(2, [9]))]
+    )
+    energy_archive = archive.Archive(tmp_path)
+    archive.append_new_details(energy_archive, connection)
+
+    buckets = [(1740787200, 1740873599), (1740787200, 1740960000)]
+    columns = EnergyColumns()
+    for charger_id, timestamp, energy in connection.execute(
+        "SELECT charger_id, timestamp, energy FROM energy_details"
+    ):
+        columns.append(charger_id, timestamp, energy)
+    expected = costs.bucket_totals(columns, FlatPricing(), buckets)
+
+    assert archive.bucket_totals(energy_archive, FlatPricing(), buckets) == expected
+    assert expected["c1"][0] == costs.Totals(9.0 + 21.0, 2 * 30.0)
@@ -0,0 +1,12 @@
+def test_benchmark_scenario_smoke(tmp_path, monkeypatch):
+    # Keep anything the pipeline writes to the working directory out of the repo
+    monkeypatch.chdir(tmp_path)
+    from benchmarks import run
+
+    result = run.run_scenario("smoke", chargers=2, days=3, latency=0)
+
+    # One session a day per charger, whose first of 16 details has no energy
+    assert result.rows == 2 * 3 * 15
+    # Token, charger list, prices for 4 days and one history page per charger
+    assert result.requests == 1 + 1 + 4 + 2
+    assert result.wall_time > 0
@@ -0,0 +1,62 @@
+import gzip
+
+import pytest
+import requests
+
+import capture
+import http_client
+from benchmarks.fake_server import FakeServer
+
+
+def test_record_and_replay(tmp_path, monkeypatch):
+    path = str(tmp_path / "capture.jsonl.gz")
+    monkeypatch.setenv("CHARGING_COSTS_RECORD", path)
+    capture.start(path)
+
+    with FakeServer(chargers=2) as server:
+        session = http_client.create_session()
+        token = session.post(f"{server.url}/oauth/token", data={"password": "secret"})
+        headers = {"Authorization": "Bearer fake-token"}
+        chargers = session.get(
+            f"{server.url}/api/chargers?PageSize=10&PageIndex=0", headers=headers
+        )
+        missing = session.get(f"{server.url}/api/missing", headers=headers)
+
+    with gzip.open(path, "rt") as f:
+        archive = f.read()
+    assert "secret" not in archive
+    assert "fake-token" not in archive
+
+    monkeypatch.delenv("CHARGING_COSTS_RECORD")
+    monkeypatch.setenv("CHARGING_COSTS_REPLAY", path)
+    session = http_client.create_session()
+    # Query parameters may come in any order
+    replayed = session.get(f"{server.url}/api/chargers?PageIndex=0&PageSize=10")
+    assert replayed.json() == chargers.json()
+    assert session.get(f"{server.url}/api/missing").status_code == missing.status_code
+    assert (
+        session.post(f"{server.url}/oauth/token").json()["access_token"] == "replayed"
+    )
+    assert token.json()["access_token"] == "fake-token"
+
+    with pytest.raises(requests.ConnectionError, match="No recorded response"):
+        session.get(f"{server.url}/api/chargers?PageIndex=1&PageSize=10")
+
+
+def test_replay_in_recorded_order(tmp_path):
+    path = str(tmp_path / "capture.jsonl.gz")
+    for content in ("first", "second"):
+        with open(path, "ab") as f:
+            f.write(
+                gzip.compress(
+                    f'{{"key": "GET http://host/a?", "status": 200, "headers": {{}}, "content": "{content}"}}\n'.encode()
+                )
+            )
+
+    session = requests.Session()
+    session.mount("http://", capture.ReplayAdapter(capture.Archive(path)))
+    assert [session.get("http://host/a").text for _ in range(3)] == [
+        "first",
+        "second",
+        "second",
+    ]
@@ -10,14 +10,14 @@ import config
 @pytest.fixture
 def temp_config_file():
     """Create a temporary config file for testing."""
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
         temp_path = Path(f.name)
-    
+
     original_config_file = config.CONFIG_FILE
     config.CONFIG_FILE = temp_path
-    
+
     yield temp_path
-    
+
     # Cleanup
     if temp_path.exists():
         temp_path.unlink()
@@ -33,10 +33,10 @@ def test_load_config_nonexistent_file(temp_config_file):
 def test_load_config_existing_file(temp_config_file):
     """Test loading config from existing file."""
     test_config = {"zaptec_username": "test_user", "zaptec_password": "test_pass"}
-    
+
     with open(temp_config_file, "w") as f:
         json.dump(test_config, f)
-    
+
     result = config.load_config()
     assert result == test_config
 
@@ -44,12 +44,12 @@ def test_load_config_existing_file(temp_config_file):
 def test_save_config(temp_config_file):
     """Test saving config to file."""
     test_config = {"zaptec_username": "test_user", "zaptec_password": "test_pass"}
-    
+
     config.save_config(test_config)
-    
+
     with open(temp_config_file, "r") as f:
         saved_config = json.load(f)
-    
+
     assert saved_config == test_config
 
 
@@ -65,22 +65,24 @@ def test_get_zaptec_credentials_from_config(temp_config_file):
     """Test getting credentials from config file."""
     test_config = {"zaptec_username": "config_user", "zaptec_password": "config_pass"}
     config.save_config(test_config)
-    
+
     username, password = config.get_zaptec_credentials()
     assert username == "config_user"
     assert password == "config_pass"
 
 
 @patch.dict(os.environ, {}, clear=True)  # Clear all env vars
-@patch('config.input', return_value="prompt_user")
-@patch('config.getpass', return_value="prompt_pass")
-def test_get_zaptec_credentials_prompt_and_save(mock_getpass, mock_input, temp_config_file):
+@patch("config.input", return_value="prompt_user")
+@patch("config.getpass", return_value="prompt_pass")
+def test_get_zaptec_credentials_prompt_and_save(
+    mock_getpass, mock_input, temp_config_file
+):
     """Test prompting for credentials and saving them."""
     username, password = config.get_zaptec_credentials()
-    
+
     assert username == "prompt_user"
     assert password == "prompt_pass"
-    
+
     # Verify credentials were saved
     saved_config = config.load_config()
     assert saved_config["zaptec_username"] == "prompt_user"
@@ -88,8 +90,8 @@ def test_get_zaptec_credentials_prompt_and_save(mock_getpass, mock_input, temp_c
 
 
 @patch.dict(os.environ, {}, clear=True)  # Clear all env vars
-@patch('config.input', return_value="")
-@patch('config.getpass', return_value="")
+@patch("config.input", return_value="")
+@patch("config.getpass", return_value="")
 def test_get_zaptec_credentials_empty_input(mock_getpass, mock_input, temp_config_file):
     """Test error when empty credentials are provided."""
     with pytest.raises(ValueError, match="Username and password are required"):
@@ -113,6 +115,31 @@ def test_get_zaptec_base_url_from_config(temp_config_file):
     """Test getting base URL from config file."""
     test_config = {"zaptec_base_url": "https://config.api.com"}
     config.save_config(test_config)
-    
+
     url = config.get_zaptec_base_url()
-    assert url == "https://config.api.com"
\ No newline at end of file
+    assert url == "https://config.api.com"
+
+
+def test_get_accounts_from_config(temp_config_file):
+    """Test getting several accounts from config file."""
+    accounts = [
+        {"name": "Acme", "username": "acme", "password": "secret"},
+        {
+            "name": "Other",
+            "username": "other",
+            "password": "secret",
+            "installation_id": "x",
+        },
+    ]
+    config.save_config({"accounts": accounts})
+
+    with patch.dict(os.environ, {}, clear=True):
+        assert config.get_accounts() == accounts
+
+
+@patch.dict(os.environ, {"ZAPTEC_USERNAME": "env_user", "ZAPTEC_PASSWORD": "env_pass"})
+def test_get_accounts_defaults_to_credentials(temp_config_file):
+    """Test that the configured credentials are the only account by default."""
+    assert config.get_accounts() == [
+        {"name": "env_user", "username": "env_user", "password": "env_pass"}
+    ]
@@ -0,0 +1,27 @@
+import costs
+from energy import EnergyColumns
+
+
+def test_bucket_totals_overlapping_buckets(price_index):
+    columns = EnergyColumns()
+    # 09:45-10:00, 10:00-10:15 and a sample outside all buckets
+    columns.append("a", 1749290400, 1.0)
+    columns.append("a", 1749291300, 2.0)
+    columns.append("a", 1749390000, 4.0)
+    buckets = [(1749286800, 1749293999), (1749290400, 1749293999)]
+
+    totals = costs.bucket_totals(columns, price_index, buckets)
+
+    assert totals["a"][0] == costs.Totals(energy=3.0, cost=5.0)
+    assert totals["a"][1] == costs.Totals(energy=2.0, cost=4.0)
+
+
+def test_interval_costs_match_bucket_totals(price_index):
+    rows = [(1749290400, 1.0), (1749291300, 2.0), (1749291400, 0.0), (1749390000, 4.0)]
+
+    intervals = list(costs.interval_costs(rows, price_index, 1749286800, 1749293999))
+
+    assert intervals == [
+        (1749290400, 1.0, 1.0, 1.0),
+        (1749291300, 2.0, 2.0, 4.0),
+    ]
@@ -0,0 +1,31 @@
+import io
+
+import headless
+
+
+def test_quiet_console_strips_markup():
+    file = io.StringIO()
+    console = headless.QuietConsole(file)
+
+    console.print("[bold]Charger 1[/bold] [red]Error[/red] [1]")
+
+    assert file.getvalue() == "Charger 1 Error [1]\n"
+
+
+def test_quiet_progress_logs_coarse_steps():
+    file = io.StringIO()
+    progress = headless.QuietProgress(headless.QuietConsole(file), step=25)
+
+    chargers = progress.add_task("Processing chargers...", total=8)
+    pages = progress.add_task("Fetching data...", total=None)
+    for _ in range(8):
+        progress.update(pages, total=10, completed=5)
+        progress.advance(chargers)
+    progress.remove_task(pages)
+
+    assert file.getvalue().splitlines() == [
+        "Processing chargers... 25% (2/8)",
+        "Processing chargers... 50% (4/8)",
+        "Processing chargers... 75% (6/8)",
+        "Processing chargers... 100% (8/8)",
+    ]
@@ -0,0 +1,95 @@
+import datetime
+import json
+
+import pytest
+
+from benchmarks.fake_server import FakeServer
+
+
+@pytest.fixture
+def fake_accounts(tmp_path, monkeypatch):
+    # Account workers install an HTTP cache in the working directory
+    monkeypatch.chdir(tmp_path)
+    with FakeServer(chargers=2, latency=0) as server:
+        accounts = [
+            {
+                "name": "Acme",
+                "username": "acme",
+                "password": "x",
+                "base_url": server.url,
+            },
+            {
+                "name": "Other",
+                "username": "other",
+                "password": "y",
+                "base_url": server.url,
+            },
+        ]
+        (tmp_path / "accounts.json").write_text(json.dumps(accounts))
+        monkeypatch.setenv("CHARGING_COSTS_ACCOUNTS", str(tmp_path / "accounts.json"))
+        monkeypatch.setenv("ZAPTEC_RATE_LIMIT", "10000")
+        monkeypatch.setenv("MGREY_BASE_URL", server.url)
+        monkeypatch.setenv("CHARGING_COSTS_STORE", str(tmp_path / "history.db"))
+        monkeypatch.setenv("CHARGING_COSTS_PRICE_STORE", str(tmp_path / "prices.db"))
+        yield server
+
+
+def test_run_accounts_merges_report(fake_accounts, capsys):
+    import main
+    import tariffs
+    from rich.console import Console
+
+    start = datetime.datetime(2024, 12, 29, tzinfo=datetime.UTC)
+    end = datetime.datetime(2025, 1, 1, tzinfo=datetime.UTC)
+    report_periods = [("test", start, end)]
+    pricing = tariffs.PricingEngine()
+    pricing.prefetch(start.date(), end.date())
+
+    main.run_accounts(
+        Console(width=200),
+        report_periods,
+        pricing,
+        ["*"],
+        workers=2,
+        processes=2,
+        sync=True,
+    )
+
+    output = capsys.readouterr().out
+    assert "Acme" in output and "Other" in output
+    # Two accounts with two chargers, one session per day
+    assert "All accounts\nCharges: 12\n" in output
+    assert fake_accounts.requests["/oauth/token"] == 2
+
+
+def test_list_matching_chargers(fake_accounts, monkeypatch):
+    import main
+
+    monkeypatch.setenv("ZAPTEC_USERNAME", "acme")
+    monkeypatch.setenv("ZAPTEC_PASSWORD", "x")
+    monkeypatch.setenv("ZAPTEC_BASE_URL", fake_accounts.url)
+    monkeypatch.setattr("zaptec._token", None)
+    monkeypatch.setattr("zaptec._account", None)
+
+    def names(chargers):
+        return [c["Name"] for c in chargers]
+
+    assert names(main.list_matching_chargers(["*"])) == ["Charger 0", "Charger 1"]
+    assert names(main.list_matching_chargers(["Charger 1"])) == ["Charger 1"]
+    assert names(main.list_matching_chargers(["*0", "charger-1"])) == [
+        "Charger 0",
+        "Charger 1",
+    ]
+    assert names(main.list_matching_chargers(["*"], "installation-1")) == ["Charger 1"]
+    # Listings are reused until the TTL runs out
+    requests = fake_accounts.requests["/api/chargers"]
+    main.list_matching_chargers(["*"])
+    assert fake_accounts.requests["/api/chargers"] == requests
+
+
+def test_parse_charger_patterns():
+    import main
+
+    assert main.parse_charger_patterns("all") == ["*"]
+    assert main.parse_charger_patterns("A, B*") == ["A", "B*"]
+    assert main.parse_charger_patterns(("A", "B")) == ["A", "B"]
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counters_and_histograms():
+    metrics.count("http_requests", endpoint="/api/chargers", status=200)
+    metrics.count("http_requests", endpoint="/api/chargers", status=200)
+    metrics.count("priced_samples", 10)
+    metrics.observe("http_request_seconds", 0.02, endpoint="/espot")
+    metrics.observe("http_request_seconds", 3.0, endpoint="/espot")
+    with metrics.phase("prices"):
+        pass
+
+    data = json.loads(metrics.to_json())
+
+    assert data["counters"][0] == {
+        "name": "http_requests",
+        "labels": {"endpoint": "/api/chargers", "status": 200},
+        "value": 2,
+    }
+    histogram = data["histograms"][0]
+    assert histogram["count"] == 2
+    assert histogram["buckets"]["0.025"] == 1
+    assert histogram["buckets"]["5.0"] == 1
+    assert "prices" in data["phases"]
+
+
+def test_openmetrics():
+    metrics.count("priced_samples", 10)
+    metrics.observe("http_request_seconds", 0.02, endpoint="/espot")
+
+    lines = metrics.to_openmetrics().splitlines()
+
+    assert "# TYPE priced_samples counter" in lines
+    assert "priced_samples_total 10.0" in lines
+    assert 'http_request_seconds_bucket{endpoint="/espot",le="0.01"} 0' in lines
+    assert 'http_request_seconds_bucket{endpoint="/espot",le="+Inf"} 1' in lines
+    assert lines[-1] == "# EOF"
+
+
+def test_openmetrics_escapes_label_values():
+    metrics.count("zaptec_chargers", charger='Garage "A"\\1\nB')
+
+    lines = metrics.to_openmetrics().splitlines()
+
+    assert 'zaptec_chargers_total{charger="Garage \\"A\\"\\\\1\\nB"} 1.0' in lines
+
+
+def test_merge_adds_snapshot():
+    metrics.count("http_requests", endpoint="/espot", status=200)
+    metrics.observe("http_request_seconds", 0.02, endpoint="/espot")
+    with metrics.phase("prices"):
+        pass
+    snapshot = metrics.snapshot()
+
+    metrics.merge(snapshot)
+
+    data = metrics.snapshot()
+    assert data["counters"][0]["value"] == 2
+    assert data["histograms"][0]["count"] == 2
+    assert data["phases"]["prices"] == 2 * snapshot["phases"]["prices"]
@@ -0,0 +1,154 @@
+import datetime
+from unittest.mock import Mock
+
+import pytest
+
+import http_client
+import mgrey
+
+
+@pytest.fixture
+def mock_session(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHARGING_COSTS_PRICE_STORE", str(tmp_path / "prices.db"))
+    session = Mock()
+    session.request.return_value.status_code = 200
+    session.request.return_value.content = b"{}"
+    session.request.return_value.from_cache = False
+    http_client.set_session(session)
+    mgrey.get_prices.cache_clear()
+
+    yield session
+
+    http_client.set_session(None)
+    mgrey.get_prices.cache_clear()
+
+
+def test_get_prices_uses_shared_session(mock_session):
+    mock_session.request.return_value.json.return_value = {
+        "date": "2025-06-07",
+        "SE3": [{"hour": 0, "price_sek": 12.5}],
+    }
+
+    prices = mgrey.get_prices(datetime.date(2025, 6, 7))
+
+    assert prices == [{"hour": 0, "price_sek": 12.5}]
+    method, url = mock_session.request.call_args.args
+    assert (method, url) == ("GET", "https://mgrey.se/espot")
+    assert mock_session.request.call_args.kwargs["params"]["date"] == "2025-06-07"
+    assert "timeout" in mock_session.request.call_args.kwargs
+
+
+def hourly_prices(hours):
+    return [{"hour": h, "price_sek": float(h)} for h in hours]
+
+
+def test_build_day_index_hourly():
+    index = mgrey.build_day_index(datetime.date(2025, 6, 7), hourly_prices(range(24)))
+
+    # Local midnight in summer is 22:00 UTC the day before
+    start = int(datetime.datetime(2025, 6, 6, 22, tzinfo=datetime.UTC).timestamp())
+    assert len(index) == 24 * 4
+    assert index[start] == 0.0
+    assert index[start + 3 * mgrey.SLOT] == 0.0
+    assert index[start + 3600] == 0.01
+
+
+def test_build_day_index_dst_days():
+    short_day = mgrey.build_day_index(
+        datetime.date(2025, 3, 30), hourly_prices(range(23))
+    )
+    long_day = mgrey.build_day_index(
+        datetime.date(2025, 10, 26), hourly_prices(range(25))
+    )
+
+    assert len(short_day) == 23 * 4
+    assert len(long_day) == 25 * 4
+
+
+def test_build_day_index_quarter_hours():
+    prices = [{"hour": i // 4, "price_sek": float(i)} for i in range(96)]
+    index = mgrey.build_day_index(datetime.date(2025, 11, 1), prices)
+
+    start, _ = mgrey.day_bounds(datetime.date(2025, 11, 1))
+    assert len(index) == 96
+    assert index[start + mgrey.SLOT] == 0.01
+
+
+def test_build_day_index_unexpected_count():
+    with pytest.raises(RuntimeError, match="unexpected number of prices"):
+        mgrey.build_day_index(datetime.date(2025, 6, 7), hourly_prices(range(7)))
+
+
+def test_price_index_loads_day_on_demand(mock_session):
+    mock_session.request.return_value.json.return_value = {
+        "SE3": hourly_prices(range(24)),
+    }
+    index = mgrey.PriceIndex("SE3")
+
+    dt = datetime.datetime(2025, 6, 7, 10, 30, tzinfo=datetime.UTC)
+    assert index.price_at(int(dt.timestamp())) == 0.12
+    assert index.price_at(int(dt.timestamp()) + 60) == 0.12
+    assert mock_session.request.call_count == 1
+
+
+def test_get_prices_stores_past_days(mock_session):
+    mock_session.request.return_value.json.return_value = {
+        "SE3": hourly_prices(range(24)),
+        "SE4": hourly_prices(range(1, 25)),
+    }
+
+    mgrey.get_prices(datetime.date(2025, 6, 7), "SE3")
+    mgrey.get_prices.cache_clear()
+    prices = mgrey.get_prices(datetime.date(2025, 6, 7), "SE4")
+
+    assert prices == hourly_prices(range(1, 25))
+    assert mock_session.request.call_count == 1
+
+
+def test_get_prices_does_not_store_today(mock_session):
+    mock_session.request.return_value.json.return_value = {
+        "SE3": hourly_prices(range(24)),
+    }
+    today = datetime.datetime.now(mgrey.TIMEZONE).date()
+
+    mgrey.get_prices(today)
+    mgrey.get_prices.cache_clear()
+    mgrey.get_prices(today)
+
+    assert mock_session.request.call_count == 2
+
+
+def test_get_prices_range(mock_session):
+    mock_session.request.return_value.json.return_value = {
+        "SE3": hourly_prices(range(24)),
+    }
+
+    index = mgrey.get_prices_range(
+        datetime.date(2025, 6, 1), datetime.date(2025, 6, 3), "SE3"
+    )
+
+    assert index.loaded_dates == {
+        datetime.date(2025, 6, 1),
+        datetime.date(2025, 6, 2),
+        datetime.date(2025, 6, 3),
+    }
+    assert len(index.prices) == 3 * 24 * 4
+    assert mock_session.request.call_count == 3
+
+
+def test_get_prices_range_skips_unpublished_days(mock_session):
+    today = datetime.datetime.now(mgrey.TIMEZONE).date()
+    tomorrow = today + datetime.timedelta(days=1)
+    start, end = mgrey.day_bounds(today)
+
+    def mock_json():
+        date = mock_session.request.call_args.kwargs["params"]["date"]
+        if date == tomorrow.isoformat():
+            return {"date": date}
+        return {"date": date, "SE3": hourly_prices(range((end - start) // 3600))}
+
+    mock_session.request.return_value.json.side_effect = mock_json
+
+    index = mgrey.get_prices_range(today, tomorrow, "SE3", max_workers=1)
+
+    assert index.loaded_dates == {today}
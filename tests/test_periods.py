@@ -0,0 +1,44 @@
+import datetime
+
+import pytest
+
+import periods
+
+
+@pytest.mark.parametrize(
+    "period, first, last",
+    [
+        ("2024-Q3", datetime.date(2024, 7, 1), datetime.date(2024, 9, 30)),
+        ("2024q4", datetime.date(2024, 10, 1), datetime.date(2024, 12, 31)),
+        ("2024-02", datetime.date(2024, 2, 1), datetime.date(2024, 2, 29)),
+        ("2025-12", datetime.date(2025, 12, 1), datetime.date(2025, 12, 31)),
+        (2024, datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)),
+        (
+            "2025-01-01..2025-02-15",
+            datetime.date(2025, 1, 1),
+            datetime.date(2025, 2, 15),
+        ),
+    ],
+)
+def test_parse_period(period, first, last):
+    start_date, end_date = periods.parse_period(period)
+
+    assert start_date.date() == first
+    assert end_date.date() == last
+    assert end_date.time() == datetime.time(23, 59, 59)
+
+
+def test_parse_period_invalid():
+    with pytest.raises(ValueError, match="Invalid period"):
+        periods.parse_period("last week")
+
+
+def test_parse_periods():
+    assert [label for label, _, _ in periods.parse_periods("Q1, 2024-05")] == [
+        "Q1",
+        "2024-05",
+    ]
+    assert [label for label, _, _ in periods.parse_periods(("Q1", "Q2"))] == [
+        "Q1",
+        "Q2",
+    ]
@@ -0,0 +1,173 @@
+import datetime
+
+import pytest
+
+import costs
+import mgrey
+import rollups
+import store
+
+
+class HourlyPrice:
+    def price_at(self, timestamp):
+        # A different price every hour, so misplaced samples change the cost
+        return 1.0 + timestamp // 3600 % 24
+
+
+def local(*args):
+    return int(datetime.datetime(*args, tzinfo=mgrey.TIMEZONE).timestamp())
+
+
+def test_split_period():
+    first = local(2025, 2, 27, 10, 30)
+    last = local(2025, 4, 2, 13) - 1
+    buckets, fragments = rollups.split_period(first, last)
+
+    assert fragments == [(first, local(2025, 2, 27, 11) - 1)]
+    assert buckets["month"] == [local(2025, 3, 1)]
+    assert buckets["day"] == [local(2025, 2, 28), local(2025, 4, 1)]
+    assert len(buckets["hour"]) == 13 + 13
+
+    # DST starts on 2025-03-30, the month is an hour short
+    covered = sum(
+        rollups.bucket_bounds(resolution, start)[1] - start
+        for resolution, starts in buckets.items()
+        for start in starts
+    )
+    assert covered + 30 * 60 == last + 1 - first
+
+
+def test_totals_match_raw_details(connection, make_session):
+    details = [
+        (f"2025-03-{day:02}T{hour:02}:{minute:02}:00+00:00", 0.25 * (day + minute))
+        for day in (1, 15, 31)
+        for hour in (0, 22, 23)
+        for minute in (0, 15, 30, 45)
+    ]
+    store.save_sessions(
+        connection, "c1", [make_session("s1", "2025-03-01T00:00:00", details)]
+    )
+
+    def price_table(first, last):
+        return HourlyPrice()
+
+    # Samples on the hour are metered in the hour before
+    assert rollups.update(connection, "c1", "a", price_table) == 3 * 5
+    assert rollups.update(connection, "c1", "a", price_table) == 0
+
+    rows = connection.execute(
+        "SELECT timestamp, energy FROM energy_details ORDER BY timestamp"
+    ).fetchall()
+    for first, last in [
+        (local(2025, 3, 1), local(2025, 4, 1) - 1),
+        (local(2025, 3, 15, 23, 30), local(2025, 3, 31, 23) - 1),
+        (local(2025, 3, 1, 0, 10), local(2025, 3, 1, 0, 40)),
+    ]:
+        expected = list(costs.interval_costs(rows, HourlyPrice(), first, last))
+        totals = rollups.totals(connection, "c1", first, last, price_table)
+        assert totals.energy == pytest.approx(sum(row[1] for row in expected))
+        assert totals.cost == pytest.approx(sum(row[3] for row in expected))
+
+
+def test_update_only_new_hours(connection, make_session):
+    def price_table(first, last):
+        return HourlyPrice()
+
+    first = make_session(
+        "s1", "2025-03-01T10:00:00", [("2025-03-01T10:15:00+00:00", 1.0)]
+    )
+    store.save_sessions(connection, "c1", [first])
+    assert rollups.update(connection, "c1", "a", price_table) == 1
+
+    second = make_session(
+        "s2", "2025-03-02T10:00:00", [("2025-03-02T10:15:00+00:00", 2.0)]
+    )
+    store.save_sessions(connection, "c1", [second])
+    assert rollups.update(connection, "c1", "a", price_table) == 1
+
+    month = rollups.totals(
+        connection, "c1", local(2025, 3, 1), local(2025, 4, 1) - 1, price_table
+    )
+    assert month.energy == 3.0
+
+    # A new pricing builds all rollups again
+    assert rollups.update(connection, "c1", "b", price_table) == 2
+
+
+class StoreAfterRead:
+    """Connection that lets another connection store sessions right after the
+    dirty hours are read."""
+
+    def __init__(self, connection, store_sessions):
+        self.connection = connection
+        self.store_sessions = store_sessions
+
+    def execute(self, sql, *args):
+        cursor = self.connection.execute(sql, *args)
+        if sql.startswith("SELECT hour FROM rollup_dirty") and self.store_sessions:
+            rows = cursor.fetchall()
+            self.store_sessions()
+            self.store_sessions = None
+            return iter(rows)
+        return cursor
+
+    def executemany(self, sql, *args):
+        return self.connection.executemany(sql, *args)
+
+    def __enter__(self):
+        return self.connection.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.connection.__exit__(*exc_info)
+
+
+def test_update_keeps_hours_stored_meanwhile(tmp_path, make_session):
+    def price_table(first, last):
+        return HourlyPrice()
+
+    path = tmp_path / "history.db"
+    connection = store.connect(path)
+    other = store.connect(path)
+    store.save_sessions(
+        connection,
+        "c1",
+        [
+            make_session(
+                "s1", "2025-03-01T10:00:00", [("2025-03-01T10:15:00+00:00", 3.0)]
+            )
+        ],
+    )
+    rollups.update(connection, "c1", "a", price_table)
+
+    store.save_sessions(
+        connection,
+        "c1",
+        [
+            make_session(
+                "s2", "2025-03-02T10:00:00", [("2025-03-02T10:15:00+00:00", 2.0)]
+            )
+        ],
+    )
+
+    def store_in_other_connection():
+        store.save_sessions(
+            other,
+            "c1",
+            [
+                make_session(
+                    "s3", "2025-03-03T10:00:00", [("2025-03-03T10:15:00+00:00", 2.0)]
+                )
+            ],
+        )
+
+    rollups.update(
+        StoreAfterRead(connection, store_in_other_connection), "c1", "a", price_table
+    )
+    rollups.update(connection, "c1", "a", price_table)
+
+    month = rollups.totals(
+        connection, "c1", local(2025, 3, 1), local(2025, 4, 1) - 1, price_table
+    )
+    assert month.energy == 7.0
+    other.close()
+    connection.close()
@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+import requests
+
+from benchmarks.fake_server import FakeServer
+
+
+@pytest.fixture
+def cost_server(tmp_path, monkeypatch):
+    with FakeServer(chargers=2, latency=0) as backend:
+        monkeypatch.setenv("ZAPTEC_USERNAME", "user")
+        monkeypatch.setenv("ZAPTEC_PASSWORD", "password")
+        monkeypatch.setenv("ZAPTEC_BASE_URL", backend.url)
+        monkeypatch.setenv("ZAPTEC_RATE_LIMIT", "10000")
+        monkeypatch.setenv("MGREY_BASE_URL", backend.url)
+        monkeypatch.setenv("CHARGING_COSTS_STORE", str(tmp_path / "history.db"))
+        monkeypatch.setenv("CHARGING_COSTS_PRICE_STORE", str(tmp_path / "prices.db"))
+        monkeypatch.setattr("zaptec._token", None)
+        monkeypatch.setattr("zaptec._account", None)
+
+        import server
+
+        history_start = datetime.datetime.now(datetime.UTC) - datetime.timedelta(days=3)
+        with server.CostServer(
+            port=0, refresh_interval=3600, history_start=history_start
+        ) as cost_server:
+            thread = server.threading.Thread(target=cost_server.serve_forever)
+            thread.start()
+            assert cost_server.refreshed.wait(10)
+            yield cost_server, backend
+            cost_server.shutdown()
+            thread.join()
+
+
+def test_cost_query(cost_server):
+    cost_server, backend = cost_server
+    history_requests = backend.requests["/api/chargehistory"]
+
+    response = requests.get(
+        f"{cost_server.url}/cost",
+        params={"charger": "Charger 1", "from": "2024-12-29", "to": "2024-12-31"},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["charger_id"] == "charger-1"
+    assert body["charges"] == 3
+    assert body["energy_kwh"] == pytest.approx(3 * 15 * 2.75)
+    # History before the synced range was fetched on demand
+    history_requests_after = backend.requests["/api/chargehistory"]
+    assert history_requests_after > history_requests
+
+    # The second query is answered from the store
+    assert requests.get(response.url).json() == body
+    assert backend.requests["/api/chargehistory"] == history_requests_after
+
+
+def test_bad_requests(cost_server):
+    cost_server, _ = cost_server
+
+    missing = requests.get(f"{cost_server.url}/cost", params={"charger": "Charger 1"})
+    unknown = requests.get(
+        f"{cost_server.url}/cost", params={"charger": "Nope", "period": "2024-12"}
+    )
+
+    assert missing.status_code == 400
+    assert unknown.status_code == 404
+    assert requests.get(f"{cost_server.url}/health").json()["refreshed_at"]
+
+
+def test_user_and_session_queries(cost_server):
+    cost_server, _ = cost_server
+    params = {"from": "2024-12-29", "to": "2024-12-31"}
+    # Fetch the history of the period first
+    requests.get(f"{cost_server.url}/cost", params={"charger": "Charger 0", **params})
+    requests.get(f"{cost_server.url}/cost", params={"charger": "Charger 1", **params})
+
+    users = requests.get(f"{cost_server.url}/users", params=params).json()
+    sessions = requests.get(
+        f"{cost_server.url}/sessions", params={"user": "user-0", **params}
+    ).json()
+
+    assert sorted(user["charges"] for user in users) == [2, 4]
+    assert sum(user["energy_kwh"] for user in users) == pytest.approx(6 * 15 * 2.75)
+    assert {session["user_id"] for session in sessions} == {"user-0"}
+    assert len(sessions) == next(
+        user["charges"] for user in users if user["user_id"] == "user-0"
+    )
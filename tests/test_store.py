@@ -0,0 +1,220 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import store
+from energy import parse_time
+
+
+def test_sync_fetches_only_new_sessions(connection, monkeypatch, make_session):
+    calls = []
+    responses = [
+        [
+            make_session(
+                "s1", "2025-04-02T10:00:00", [("2025-04-02T10:15:00+00:00", 1.5)]
+            )
+        ],
+        [
+            make_session(
+                "s2", "2025-05-02T10:00:00", [("2025-05-02T10:15:00+00:00", 2.0)]
+            )
+        ],
+    ]
+
+    def mock_iter_session_pages(charger_id, from_date, to_date, **kwargs):
+        calls.append((from_date, to_date))
+        yield responses[len(calls) - 1]
+
+    monkeypatch.setattr("store.zaptec.iter_session_pages", mock_iter_session_pages)
+
+    utc = datetime.UTC
+    start = datetime.datetime(2025, 4, 1, tzinfo=utc)
+    store.sync_charger(
+        connection, "c1", start, datetime.datetime(2025, 5, 1, tzinfo=utc)
+    )
+    store.sync_charger(
+        connection, "c1", start, datetime.datetime(2025, 6, 1, tzinfo=utc)
+    )
+    # Already synced, nothing is fetched
+    store.sync_charger(
+        connection, "c1", start, datetime.datetime(2025, 5, 15, tzinfo=utc)
+    )
+
+    assert len(calls) == 2
+    assert calls[1] == (
+        datetime.datetime(2025, 5, 1, tzinfo=utc) - store.SYNC_OVERLAP,
+        datetime.datetime(2025, 6, 1, tzinfo=utc),
+    )
+
+    end = datetime.datetime(2025, 6, 1, tzinfo=utc)
+    details = store.iter_details(connection, "c1", start, end).fetchall()
+    assert store.count_sessions(connection, "c1", start, end) == 2
+    assert [energy for _, energy in details] == [1.5, 2.0]
+
+
+def test_sync_resumes_from_checkpoint(connection, monkeypatch, make_session):
+    listing = [
+        make_session(f"s{day}", f"2025-04-0{day}T10:00:00", [])
+        for day in (5, 4, 3, 2, 1)
+    ]
+    to_dates = []
+
+    def mock_iter_session_pages(charger_id, from_date, to_date, **kwargs):
+        to_dates.append(to_date)
+        sessions = [
+            session
+            for session in listing
+            if from_date.timestamp()
+            <= parse_time(session["StartDateTime"])
+            <= to_date.timestamp()
+        ]
+        for page_index in range(0, len(sessions), 2):
+            if page_index == 2 and len(to_dates) == 1:
+                raise ConnectionError("connection reset")
+            yield sessions[page_index : page_index + 2]
+
+    monkeypatch.setattr("store.zaptec.iter_session_pages", mock_iter_session_pages)
+
+    utc = datetime.UTC
+    start = datetime.datetime(2025, 4, 1, tzinfo=utc)
+    end = datetime.datetime(2025, 5, 1, tzinfo=utc)
+    with pytest.raises(ConnectionError):
+        store.sync_charger(connection, "c1", start, end)
+    assert store.get_sync_state(connection, "c1") is None
+    assert store.count_sessions(connection, "c1", start, end) == 2
+
+    # A session that was still running ends and is listed first, which moves
+    # every older session one place down the pages
+    listing.insert(0, make_session("s6", "2025-04-06T10:00:00", []))
+
+    store.sync_charger(connection, "c1", start, end)
+
+    # Only sessions that started before the oldest stored one are read again,
+    # the new session is left to the overlap of the next delta sync
+    assert to_dates[1] == datetime.datetime(2025, 4, 4, 10, tzinfo=utc)
+    stored = connection.execute("SELECT session_id FROM sessions ORDER BY session_id")
+    assert [row[0] for row in stored] == ["s1", "s2", "s3", "s4", "s5"]
+    assert store.get_sync_state(connection, "c1") == (
+        int(start.timestamp()),
+        int(end.timestamp()),
+    )
+
+
+def test_connect_drops_page_checkpoints(tmp_path):
+    path = tmp_path / "store.db"
+    legacy = sqlite3.connect(path)
+    legacy.execute(
+        "CREATE TABLE sync_checkpoints (charger_id TEXT PRIMARY KEY,"
+        " range_from INTEGER NOT NULL, range_to INTEGER NOT NULL,"
+        " next_page INTEGER NOT NULL)"
+    )
+    legacy.execute("INSERT INTO sync_checkpoints VALUES ('c1', 0, 10, 3)")
+    legacy.commit()
+    legacy.close()
+
+    connection = store.connect(path)
+
+    columns = [
+        row[1] for row in connection.execute("PRAGMA table_info(sync_checkpoints)")
+    ]
+    assert columns == ["charger_id", "range_from", "range_to", "resume_to"]
+    assert connection.execute("SELECT * FROM sync_checkpoints").fetchall() == []
+
+
+def test_result_is_reused_until_data_changes(connection, make_session):
+    utc = datetime.UTC
+    start = datetime.datetime(2025, 4, 1, tzinfo=utc)
+    end = datetime.datetime(2025, 5, 1, tzinfo=utc)
+    store.save_sessions(
+        connection,
+        "c1",
+        [
+            make_session(
+                "s1", "2025-04-02T10:00:00", [("2025-04-02T10:15:00+00:00", 1.5)]
+            )
+        ],
+    )
+    fingerprint = store.data_fingerprint(connection, "c1", start, end)
+    store.save_result(connection, "c1", start, end, fingerprint, (1, 1.5, 2.0))
+
+    assert store.load_result(connection, "c1", start, end, fingerprint) == (1, 1.5, 2.0)
+
+    store.save_sessions(
+        connection,
+        "c1",
+        [
+            make_session(
+                "s2", "2025-04-03T10:00:00", [("2025-04-03T10:15:00+00:00", 1.0)]
+            )
+        ],
+    )
+    assert store.data_fingerprint(connection, "c1", start, end) != fingerprint
+
+
+class FlatPrice:
+    def __init__(self, price):
+        self.price = price
+
+    def price_at(self, timestamp):
+        return self.price
+
+
+def test_session_costs_by_user(connection, make_session):
+    tenant = make_session(
+        "s1",
+        "2025-04-02T10:00:00",
+        [("2025-04-02T10:15:00+00:00", 1.5), ("2025-04-02T10:30:00+00:00", 0.5)],
+    )
+    tenant.update(UserId="u1", UserFullName="Tenant", TokenName="Tag 1")
+    guest = make_session(
+        "s2", "2025-04-03T10:00:00", [("2025-04-03T10:15:00+00:00", 1.0)]
+    )
+    store.save_sessions(connection, "c1", [tenant, guest])
+
+    utc = datetime.UTC
+    start = datetime.datetime(2025, 4, 1, tzinfo=utc)
+    end = datetime.datetime(2025, 4, 30, tzinfo=utc)
+    tables = []
+
+    def price_table(first, last):
+        tables.append((first, last))
+        return FlatPrice(2.0)
+
+    assert store.price_sessions(connection, "c1", start, end, "a", price_table) == 2
+    # Priced once per pricing, with one table for all sessions
+    assert store.price_sessions(connection, "c1", start, end, "a", price_table) == 0
+    assert len(tables) == 1
+
+    assert store.user_totals(connection, start, end) == [
+        ("u1", "Tenant", 1, 2.0, 4.0),
+        (None, None, 1, 1.0, 2.0),
+    ]
+    rows = store.query_sessions(connection, start, end, user_id="u1").fetchall()
+    assert [dict(zip(store.SESSION_FIELDS, row))["token_name"] for row in rows] == [
+        "Tag 1"
+    ]
+
+    # A new pricing or new details price the sessions again
+    assert store.price_sessions(connection, "c1", start, end, "b", price_table) == 2
+    store.save_sessions(connection, "c1", [guest])
+    assert store.price_sessions(connection, "c1", start, end, "b", price_table) == 1
+
+
+def test_connect_migrates_old_store(tmp_path):
+    path = tmp_path / "history.db"
+    old = store.sqlite3.connect(path)
+    old.execute(
+        "CREATE TABLE sessions (charger_id TEXT NOT NULL, session_id TEXT NOT NULL,"
+        " start_time INTEGER NOT NULL, end_time INTEGER, energy REAL,"
+        " PRIMARY KEY (charger_id, session_id))"
+    )
+    old.execute("INSERT INTO sessions VALUES ('c1', 's1', 0, 0, 1.0)")
+    old.commit()
+    old.close()
+
+    connection = store.connect(path)
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(sessions)")]
+    connection.close()
+
+    assert columns[-3:] == ["user_id", "user_name", "token_name"]
@@ -0,0 +1,137 @@
+import datetime
+import pickle
+from unittest.mock import patch
+
+import pytest
+
+import costs
+import mgrey
+import tariffs
+
+
+def test_tariff_effective_price():
+    tariff = tariffs.Tariff.from_config(
+        "business",
+        {
+            "grid_fee": 0.25,
+            "energy_tax": 0.5,
+            "markup": 0.05,
+            "vat": 0.25,
+            "time_of_use": [
+                {"fee": 0.4, "hours": [6, 22], "weekdays": [0, 1, 2, 3, 4]}
+            ],
+        },
+    )
+    # Monday at 08:00 and at 23:00, and Saturday at 08:00
+    monday_day = datetime.datetime(2025, 6, 2, 8, tzinfo=mgrey.TIMEZONE)
+    monday_night = datetime.datetime(2025, 6, 2, 23, tzinfo=mgrey.TIMEZONE)
+    saturday_day = datetime.datetime(2025, 6, 7, 8, tzinfo=mgrey.TIMEZONE)
+
+    assert tariff.effective_price(1.0, monday_day) == pytest.approx(2.2 * 1.25)
+    assert tariff.effective_price(1.0, monday_night) == pytest.approx(1.8 * 1.25)
+    assert tariff.effective_price(1.0, saturday_day) == pytest.approx(1.8 * 1.25)
+    assert tariffs.SPOT.effective_price(1.0, monday_day) == 1.0
+
+
+def test_price_table_matches_index(price_index):
+    tariff = tariffs.Tariff("fee", grid_fee=0.5)
+    table = tariffs.build_table(price_index, tariff, 1749289500, 1749291299)
+
+    assert len(table.prices) == 2
+    assert table.price_at(1749289500 + 60) == 1.5
+    assert table.price_at(1749290400 + 899) == 2.5
+    with pytest.raises(RuntimeError):
+        table.price_at(1749291300)
+
+
+class UnpublishedPriceIndex:
+    def price_at(self, timestamp):
+        # Prices from 00:00 on 2025-06-08 are not published yet
+        if timestamp >= 1749333600:
+            raise RuntimeError("failed to find price")
+        return 1.0
+
+
+def test_price_table_ends_now():
+    with patch("tariffs.time.time", return_value=1749333600 - 1):
+        table = tariffs.build_table(
+            UnpublishedPriceIndex(), tariffs.SPOT, 1749290400, 1749333600 + 86399
+        )
+
+    assert table.price_at(1749333600 - 1) == 1.0
+    with pytest.raises(RuntimeError):
+        table.price_at(1749333600)
+
+
+class MissingDayPriceIndex:
+    def price_at(self, timestamp):
+        # No prices for 2025-06-08, the days around it have them
+        if 1749333600 <= timestamp < 1749420000:
+            raise RuntimeError("failed to find price")
+        return 1.0
+
+
+def test_price_table_fails_only_on_missing_slots():
+    table = tariffs.build_table(
+        MissingDayPriceIndex(), tariffs.SPOT, 1749290400, 1749420000 + 3599
+    )
+
+    # Nothing metered on the missing day is priced fine
+    rows = [(1749290400 + 900, 2.0), (1749333600 + 900, 0.0), (1749420000 + 900, 3.0)]
+    assert [
+        cost for *_, cost in costs.interval_costs(rows, table, 1749290400, 1749423599)
+    ] == [2.0, 3.0]
+    with pytest.raises(RuntimeError, match="failed to find price"):
+        table.price_at(1749333600 + 60)
+
+
+def test_engine_resolves_chargers_and_reuses_tables(price_index):
+    pricing_config = {
+        "charger-1": {"area": "SE4", "tariff": "business"},
+        "installation-1": {"tariff": "business"},
+    }
+    with (
+        patch("config.get_price_area", return_value="SE3"),
+        patch("config.get_default_tariff", return_value="spot"),
+        patch("config.get_tariffs", return_value={"business": {"markup": 0.1}}),
+        patch("config.get_charger_pricing", return_value=pricing_config),
+    ):
+        engine = tariffs.PricingEngine()
+
+    assert engine.areas() == {"SE3", "SE4"}
+    assert engine.resolve({"Id": "charger-0"}) == ("SE3", tariffs.SPOT)
+    assert engine.resolve({"Id": "charger-1"})[0] == "SE4"
+    assert engine.resolve({"Id": "x", "InstallationId": "installation-1"})[1].name == (
+        "business"
+    )
+    assert engine.fingerprint({"Id": "charger-0"}) != engine.fingerprint(
+        {"Id": "charger-1"}
+    )
+
+    engine.indexes["SE4"] = price_index
+    first = engine.charger_table({"Id": "charger-1"}, 1749289500, 1749291299)
+    again = engine.charger_table(
+        {"Name": "x", "Id": "charger-1"}, 1749289500, 1749291299
+    )
+    assert first is again
+    assert list(first.prices) == pytest.approx([1.1, 2.1])
+
+
+def test_engine_table_survives_new_prices(monkeypatch, price_index):
+    engine = tariffs.PricingEngine()
+    engine.indexes[engine.default_area] = price_index
+    build_table = tariffs.build_table
+
+    def build_and_add_day(*args):
+        # The service's refresher adds tomorrow's prices while a table is built
+        table = build_table(*args)
+        engine.add_day(datetime.date(2025, 6, 8), {})
+        return table
+
+    monkeypatch.setattr("tariffs.build_table", build_and_add_day)
+    table = engine.table(engine.default_area, tariffs.SPOT, 1749289500, 1749291299)
+    assert list(table.prices) == [1.0, 2.0]
+
+    # Worker processes get a copy with a lock of their own
+    copy = pickle.loads(pickle.dumps(engine))
+    assert copy.table(engine.default_area, tariffs.SPOT, 1749289500, 1749291299)
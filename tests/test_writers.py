@@ -0,0 +1,64 @@
+import csv
+import importlib.util
+import json
+
+import pytest
+
+import writers
+
+
+def test_csv_and_jsonl_writers(tmp_path):
+    rows = [
+        {"charger_id": "a", "energy_kwh": 1.5, "cost_sek": 0.75},
+        {"charger_id": "b", "energy_kwh": 2.0, "cost_sek": 1.0},
+    ]
+    fields = ["charger_id", "energy_kwh", "cost_sek"]
+
+    for path in (tmp_path / "report.csv", tmp_path / "report.jsonl"):
+        with writers.open_writer(path, fields) as writer:
+            for row in rows:
+                writer.write(row)
+
+    with open(tmp_path / "report.csv", newline="") as f:
+        assert [row["charger_id"] for row in csv.DictReader(f)] == ["a", "b"]
+    with open(tmp_path / "report.jsonl") as f:
+        assert [json.loads(line) for line in f] == rows
+
+
+def test_open_writer_format(tmp_path):
+    with writers.open_writer(tmp_path / "report.txt", ["a"], "jsonl") as writer:
+        writer.write({"a": 1})
+    assert (tmp_path / "report.txt").read_text() == '{"a": 1}\n'
+
+    with pytest.raises(ValueError, match="Invalid output format"):
+        writers.open_writer(tmp_path / "report.txt", ["a"])
+
+
+def test_parquet_writer(tmp_path, monkeypatch):
+    if importlib.util.find_spec("pyarrow") is None:
+        with pytest.raises(RuntimeError, match="pyarrow"):
+            writers.open_writer(tmp_path / "report.parquet", ["a"])
+        return
+
+    monkeypatch.setattr(writers.ParquetWriter, "ROW_GROUP_SIZE", 2)
+    fields = ["user_name", "energy_kwh"]
+    # The first row group has no names and whole numbers only
+    rows = [
+        {"user_name": None, "energy_kwh": 0},
+        {"user_name": None, "energy_kwh": 1},
+        {"user_name": "Tenant", "energy_kwh": 2.5},
+        {"user_name": None, "energy_kwh": 0.25},
+        {"user_name": "Guest", "energy_kwh": 3},
+    ]
+    with writers.open_writer(tmp_path / "report.parquet", fields) as writer:
+        for row in rows:
+            writer.write(row)
+
+    import pyarrow.parquet
+
+    table = pyarrow.parquet.read_table(tmp_path / "report.parquet")
+    assert str(table.schema.field("user_name").type) == "string"
+    assert str(table.schema.field("energy_kwh").type) == "double"
+    assert table.to_pylist() == [
+        {**row, "energy_kwh": float(row["energy_kwh"])} for row in rows
+    ]
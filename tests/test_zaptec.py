@@ -1,7 +1,15 @@
+import asyncio
 import datetime
+import json
+import threading
 from unittest.mock import Mock
 
+import pytest
+import requests
+
+import store
 import zaptec
+from energy import EnergyColumns
 
 
 def test_list_chargers(monkeypatch):
@@ -85,7 +93,7 @@ def test_list_chargers(monkeypatch):
     assert result[2]["Name"] == "Charger 3"
 
 
-def test_get_energy_history(monkeypatch):
+def test_sync_stores_sessions_and_details(connection, monkeypatch):
     mock_response = Mock()
     mock_response.json.return_value = {
         "Pages": 1,
@@ -158,9 +166,279 @@ def test_get_energy_history(monkeypatch):
 
     monkeypatch.setattr("zaptec.make_authenticated_request", mock_make_request)
 
+    from_date = datetime.datetime(2025, 6, 1, tzinfo=datetime.UTC)
+    to_date = datetime.datetime(2025, 6, 8, tzinfo=datetime.UTC)
+    assert store.sync_charger(connection, "xxx", from_date, to_date) == 2
+
+    assert store.count_sessions(connection, "xxx", from_date, to_date) == 2
+    assert (
+        len(store.iter_details(connection, "xxx", from_date, to_date).fetchall()) == 12
+    )
+
+
+def test_rate_limiter_spaces_requests(monkeypatch):
+    clock = [0.0]
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr("zaptec.time.monotonic", lambda: clock[0])
+    monkeypatch.setattr("zaptec.time.sleep", fake_sleep)
+
+    limiter = zaptec.RateLimiter(rate=4)
+    for _ in range(3):
+        limiter.acquire()
+
+    assert sleeps == [0.25, 0.25]
+
+
+def test_iter_session_pages_in_order(monkeypatch):
+    failed = set()
+
+    def mock_make_request(method, endpoint, **kwargs):
+        page_index = kwargs["params"]["PageIndex"]
+        response = Mock()
+        if page_index == 2 and page_index not in failed:
+            failed.add(page_index)
+            raise requests.ConnectionError("connection reset")
+        response.raise_for_status.return_value = None
+        response.json.return_value = {"Pages": 4, "Data": [{"Id": page_index}]}
+        return response
+
+    monkeypatch.setattr("zaptec.make_authenticated_request", mock_make_request)
+    monkeypatch.setattr("zaptec.time.sleep", lambda seconds: None)
+
     from_date = datetime.datetime.now()
     to_date = datetime.datetime.now()
-    result, charges_count = zaptec.get_energy_history("xxx", from_date, to_date)
+    pages = list(zaptec.iter_session_pages("xxx", from_date, to_date))
+
+    assert pages == [[{"Id": 0}], [{"Id": 1}], [{"Id": 2}], [{"Id": 3}]]
+    assert failed == {2}
+
+
+def test_energy_columns_are_compact():
+    columns = EnergyColumns()
+    columns.extend_details(
+        "xxx",
+        [
+            {"Timestamp": "2025-06-07T09:30:01.007+00:00", "Energy": 0.509},
+            {"Timestamp": "2025-06-07T09:45:00.584", "Energy": 0.883},
+        ],
+    )
+
+    assert list(columns.timestamps) == [1749288601, 1749289500]
+    assert list(columns.energies) == [0.509, 0.883]
+    assert columns.timestamps.itemsize + columns.energies.itemsize <= 16
+
+
+def test_async_client_refreshes_token_once(monkeypatch):
+    lock = threading.Lock()
+    tokens = ["old-token", "new-token"]
+    fetches = []
+
+    def mock_request(method, url, session=None, **kwargs):
+        response = Mock()
+        response.raise_for_status.return_value = None
+        if url.endswith("/oauth/token"):
+            with lock:
+                fetches.append(url)
+                access_token = tokens[len(fetches) - 1]
+            response.json.return_value = {"access_token": access_token}
+            return response
+        authorized = kwargs["headers"]["Authorization"] == "Bearer new-token"
+        response.status_code = 200 if authorized else 401
+        page_index = kwargs["params"]["PageIndex"]
+        response.json.return_value = {"Pages": 8, "Data": [{"Id": page_index}]}
+        return response
+
+    monkeypatch.setattr("zaptec.http_client.request", mock_request)
+
+    async def run():
+        async with zaptec.AsyncClient(
+            "user", "password", "https://zaptec.test", rate=10_000
+        ) as client:
+            client._token = zaptec.Token("old-token", float("inf"))
+            fetches.clear()
+            tokens.pop(0)
+            pages = client.iter_session_pages(
+                "xxx", datetime.datetime.now(), datetime.datetime.now()
+            )
+            return [session async for sessions in pages for session in sessions]
+
+    sessions = asyncio.run(run())
+
+    assert len(fetches) == 1
+    assert [session["Id"] for session in sessions] == list(range(8))
+
+
+def test_expired_token_is_refreshed(monkeypatch):
+    fetched = []
+
+    def mock_fetch_token():
+        fetched.append(True)
+        return zaptec.Token(
+            f"token-{len(fetched)}", 0.0 if len(fetched) == 1 else float("inf")
+        )
+
+    monkeypatch.setattr("zaptec.fetch_token", mock_fetch_token)
+    monkeypatch.setattr("zaptec._token", None)
+
+    assert zaptec.get_token() == "token-1"
+    # The first token expired immediately
+    assert zaptec.get_token() == "token-2"
+    assert zaptec.get_token() == "token-2"
+
+
+def test_list_chargers_pages_and_filters(monkeypatch):
+    calls = []
+
+    def mock_make_request(method, endpoint, **kwargs):
+        calls.append(dict(kwargs["params"]))
+        page_index = kwargs["params"]["PageIndex"]
+        response = Mock()
+        response.raise_for_status.return_value = None
+        response.json.return_value = {
+            "Pages": 3,
+            "Data": [{"Name": f"Charger {page_index}"}],
+        }
+        return response
+
+    monkeypatch.setattr("zaptec.make_authenticated_request", mock_make_request)
+
+    result = zaptec.list_chargers(installation_id="abc", name="Charger", page_size=1)
+
+    assert [c["Name"] for c in result] == ["Charger 0", "Charger 1", "Charger 2"]
+    assert calls[0] == {
+        "InstallationId": "abc",
+        "SearchString": "Charger",
+        "PageSize": 1,
+        "PageIndex": 0,
+    }
+
+    # The async client pages the same way
+    async def mock_request(self, method, endpoint, **kwargs):
+        return mock_make_request(method, endpoint, **kwargs)
+
+    monkeypatch.setattr("zaptec.AsyncClient.request", mock_request)
+    client = zaptec.AsyncClient("user", "password", "http://zaptec")
+    calls.clear()
+    result = asyncio.run(
+        client.list_chargers(installation_id="abc", name="Charger", page_size=1)
+    )
+    client.close()
+
+    assert [c["Name"] for c in result] == ["Charger 0", "Charger 1", "Charger 2"]
+    assert [call["PageIndex"] for call in calls] == [0, 1, 2]
+
+
+def test_list_chargers_skips_unknown_ids(monkeypatch):
+    def mock_make_request(method, endpoint, **kwargs):
+        charger_id = endpoint.rsplit("/", 1)[-1]
+        response = requests.Response()
+        response.status_code = 404 if charger_id == "typo" else 200
+        response._content = json.dumps({"Id": charger_id}).encode()
+        return response
+
+    monkeypatch.setattr("zaptec.make_authenticated_request", mock_make_request)
+
+    with pytest.warns(UserWarning, match="Unknown charger id: typo"):
+        result = zaptec.list_chargers(charger_ids=["c1", "typo", "c2"])
+
+    assert [c["Id"] for c in result] == ["c1", "c2"]
+
+
+def test_history_page_retries_only_connection_errors(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("zaptec.time.sleep", sleeps.append)
+    not_found = Mock(status_code=404)
+    not_found.raise_for_status.side_effect = requests.HTTPError("404 Not Found")
+    page = Mock(status_code=200)
+    page.json.return_value = {"Pages": 1, "Data": []}
+    responses = [requests.ConnectionError("reset"), page, not_found]
+
+    def mock_request(method, endpoint, **kwargs):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr("zaptec.make_authenticated_request", mock_request)
+    start = datetime.datetime(2025, 4, 1, tzinfo=datetime.UTC)
+    end = datetime.datetime(2025, 5, 1, tzinfo=datetime.UTC)
+
+    assert zaptec.get_history_page("c1", start, end, 10, 0) == page.json.return_value
+    assert sleeps == [1]
+    with pytest.raises(requests.HTTPError):
+        zaptec.get_history_page("c1", start, end, 10, 1)
+    assert sleeps == [1]
+
+
+def test_iter_session_pages_streams_with_bounded_lookahead(monkeypatch):
+    lock = threading.Lock()
+    requested = []
+    in_flight = [0, 0]  # current and most pages in flight
+    # The first three pages after the first are only answered once all three
+    # are in flight at the same time
+    barrier = threading.Barrier(3)
+
+    def mock_get_history_page(charger_id, from_date, to_date, page_size, page_index):
+        with lock:
+            requested.append(page_index)
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        if 1 <= page_index <= 3:
+            barrier.wait(timeout=5)
+        with lock:
+            in_flight[0] -= 1
+        return {"Pages": 10, "Data": [{"Id": page_index}]}
+
+    monkeypatch.setattr("zaptec.get_history_page", mock_get_history_page)
+    start = datetime.datetime(2025, 4, 1, tzinfo=datetime.UTC)
+    end = datetime.datetime(2025, 5, 1, tzinfo=datetime.UTC)
+    pages = zaptec.iter_session_pages("c1", start, end, max_page_workers=3)
+
+    # The first page is yielded before any other page is requested
+    assert next(pages) == [{"Id": 0}]
+    assert requested == [0]
+
+    received = 1
+    for page in pages:
+        assert page == [{"Id": received}]
+        received += 1
+        # Pages are requested at most max_page_workers ahead of the consumer
+        assert len(requested) <= received + 3
+    assert received == 10
+    assert in_flight[1] == 3
+
+
+def test_async_iter_session_pages_streams_with_bounded_lookahead(monkeypatch):
+    requested = []
+
+    async def mock_get_history_page(
+        self, charger_id, from_date, to_date, page_size, page_index
+    ):
+        requested.append(page_index)
+        await asyncio.sleep(0)
+        return {"Pages": 10, "Data": [{"Id": page_index}]}
+
+    monkeypatch.setattr("zaptec.AsyncClient.get_history_page", mock_get_history_page)
+    start = datetime.datetime(2025, 4, 1, tzinfo=datetime.UTC)
+    end = datetime.datetime(2025, 5, 1, tzinfo=datetime.UTC)
+
+    async def run():
+        client = zaptec.AsyncClient(
+            "user", "password", "http://zaptec", max_page_workers=3
+        )
+        received = 0
+        async for page in client.iter_session_pages("c1", start, end):
+            assert page == [{"Id": received}]
+            received += 1
+            # Pages are requested at most max_page_workers ahead of the consumer
+            assert len(requested) <= received + 3
+        client.close()
+        return received
 
-    assert len(result) == 12
-    assert charges_count == 2
+    assert asyncio.run(run()) == 10
+    assert sorted(requested) == list(range(10))
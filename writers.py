@@ -0,0 +1,138 @@
+import csv
+import json
+from pathlib import Path
+from typing import Optional
+
+SUMMARY_FIELDS = [
+    "account",
+    "charger_id",
+    "charger",
+    "period",
+    "from",
+    "to",
+    "charges",
+    "energy_kwh",
+    "cost_sek",
+]
+INTERVAL_FIELDS = [
+    "charger_id",
+    "charger",
+    "period",
+    "timestamp",
+    "energy_kwh",
+    "price_sek",
+    "cost_sek",
+]
+SESSION_FIELDS = [
+    "period",
+    "charger_id",
+    "charger",
+    "session_id",
+    "user_id",
+    "user_name",
+    "token_name",
+    "start",
+    "end",
+    "energy_kwh",
+    "cost_sek",
+]
+# Parquet columns are strings unless listed here, the schema must not depend on
+# which values happen to be in the first row group
+PARQUET_TYPES = {
+    "charges": "int64",
+    "energy_kwh": "float64",
+    "price_sek": "float64",
+    "cost_sek": "float64",
+}
+
+
+class Writer:
+    """Writes rows as they come, so reports of any size stream to disk."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvWriter(Writer):
+    def __init__(self, path, fields: list[str]):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fields)
+        self.writer.writeheader()
+
+    def write(self, row: dict):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlWriter(Writer):
+    def __init__(self, path, fields: list[str]):
+        self.file = open(path, "w")
+
+    def write(self, row: dict):
+        self.file.write(json.dumps(row) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter(Writer):
+    """Parquet is written a row group at a time, so rows are buffered per group."""
+
+    ROW_GROUP_SIZE = 65536
+
+    def __init__(self, path, fields: list[str]):
+        # pyarrow is slow to import, only runs writing Parquet pay for it
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError(
+                "Parquet output needs pyarrow, install it with uv sync --extra parquet"
+            ) from None
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema(
+            [(field, PARQUET_TYPES.get(field, "string")) for field in fields]
+        )
+        self.path = path
+        self.fields = fields
+        self.columns = {field: [] for field in fields}
+        self.rows = 0
+        self.writer = None
+
+    def write(self, row: dict):
+        for field in self.fields:
+            self.columns[field].append(row.get(field))
+        self.rows += 1
+        if self.rows >= self.ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        table = self.pyarrow.table(self.columns, schema=self.schema)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table)
+        self.columns = {field: [] for field in self.fields}
+        self.rows = 0
+
+    def close(self):
+        if self.rows or self.writer is None:
+            self.flush()
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+def open_writer(path, fields: list[str], format: Optional[str] = None) -> Writer:
+    """Open a writer for the format, or the format named by the file extension."""
+    format = format or Path(path).suffix.lstrip(".")
+    if format not in WRITERS:
+        raise ValueError(
+            f"Invalid output format: {format}. Must be csv, jsonl or parquet"
+        )
+    return WRITERS[format](path, fields)
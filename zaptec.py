@@ -1,94 +1,498 @@
 import requests
+import asyncio
 import datetime
-from typing import Optional
-from rich.progress import Progress
+import threading
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterator, Generator, Iterator, Optional
+from urllib.parse import urlparse
 import config
+import metrics
+import http_client
 
-_token: Optional[str] = None
+if TYPE_CHECKING:
+    from rich.progress import Progress
+
+# Refresh tokens this many seconds before they expire
+TOKEN_EXPIRY_MARGIN = 60
+
+
+@dataclass(frozen=True)
+class Token:
+    access_token: str
+    expires_at: float
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at - TOKEN_EXPIRY_MARGIN
+
+
+_token: Optional[Token] = None
+_token_lock = threading.Lock()
+# Account this process sends requests as, instead of the configured credentials
+_account: Optional[dict] = None
+
+
+class RateLimiter:
+    """Token bucket shared by all threads talking to the same host."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiters: dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(url: str) -> RateLimiter:
+    host = urlparse(url).netloc
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = RateLimiter(config.get_zaptec_rate_limit())
+        return _rate_limiters[host]
+
+
+def use_account(account: Optional[dict]):
+    """Send the requests of this process as another account, with its own token.
+    The account has a username and password, and optionally a base_url."""
+    global _account, _token
+    with _token_lock:
+        _account = account
+        _token = None
+
+
+def get_base_url() -> str:
+    if _account and _account.get("base_url"):
+        return _account["base_url"]
+    return config.get_zaptec_base_url()
 
 
 def get_token() -> str:
     global _token
-    if _token:
-        return _token
+    token = _token
+    if token and not token.expired:
+        return token.access_token
+
+    with _token_lock:
+        if _token is None or _token.expired:
+            _token = fetch_token()
+            metrics.count("zaptec_token_fetches")
+        return _token.access_token
+
+
+def invalidate_token(access_token: str):
+    """Drop the token after a 401, unless another thread already replaced it."""
+    global _token
+    with _token_lock:
+        if _token and _token.access_token == access_token:
+            _token = None
+
 
-    username, password = config.get_zaptec_credentials()
-    base_url = config.get_zaptec_base_url()
+def fetch_token(
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+    base_url: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+) -> Token:
+    if (username is None or password is None) and _account:
+        username, password = _account["username"], _account["password"]
+    if username is None or password is None:
+        username, password = config.get_zaptec_credentials()
+    base_url = base_url or get_base_url()
 
     token_url = f"{base_url}/oauth/token"
 
     data = {"grant_type": "password", "username": username, "password": password}
 
-    response = requests.post(token_url, data=data)
+    response = http_client.request("POST", token_url, session=session, data=data)
     response.raise_for_status()
 
     token_data = response.json()
-    _token = token_data["access_token"]
-    return _token
+    expires_in = token_data.get("expires_in", 86400)
+    return Token(token_data["access_token"], time.monotonic() + expires_in)
 
 
-def get_headers() -> dict[str, str]:
-    token = get_token()
+def get_headers(access_token: Optional[str] = None) -> dict[str, str]:
+    token = access_token or get_token()
     return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
 
 
 def make_authenticated_request(
     method: str, endpoint: str, **kwargs
 ) -> requests.Response:
-    base_url = config.get_zaptec_base_url()
-    url = f"{base_url}{endpoint}"
-    headers = get_headers()
+    url = f"{get_base_url()}{endpoint}"
+    extra_headers = kwargs.pop("headers", {})
 
-    if "headers" in kwargs:
-        headers.update(kwargs.pop("headers"))
+    for attempt in range(2):
+        token = get_token()
+        headers = get_headers(token)
+        headers.update(extra_headers)
+
+        get_rate_limiter(url).acquire()
+        response = http_client.request(method, url, headers=headers, **kwargs)
+        if response.status_code != 401:
+            break
+        # The token was revoked or expired early, get a new one and retry once
+        invalidate_token(token)
+
+    return response
 
-    return requests.request(method, url, headers=headers, **kwargs)
 
+def get_username() -> str:
+    if _account:
+        return _account["username"]
+    return config.get_zaptec_credentials()[0]
 
-def list_chargers() -> list[dict]:
-    response = make_authenticated_request("GET", "/api/chargers")
+
+def read_json(response: requests.Response) -> dict:
     response.raise_for_status()
-    data = response.json()
-    return data.get("Data", [])
+    return response.json()
+
+
+def get_charger(charger_id: str) -> dict:
+    response = make_authenticated_request("GET", f"/api/chargers/{charger_id}")
+    return read_json(response)
+
+
+def charger_list_params(
+    installation_id: Optional[str] = None, name: Optional[str] = None
+) -> dict:
+    params = {}
+    if installation_id:
+        params["InstallationId"] = installation_id
+    if name:
+        params["SearchString"] = name
+    return params
+
+
+def charger_list_pages(
+    installation_id: Optional[str] = None,
+    name: Optional[str] = None,
+    page_size: int = 100,
+) -> Generator[dict, dict, list[dict]]:
+    """Page through the charger list. Yields the params of each request, is sent
+    the body of its response and returns the chargers of all pages."""
+    params = charger_list_params(installation_id, name)
+    params["PageSize"] = page_size
+    chargers = []
+    page_index = 0
+    while True:
+        data = yield {**params, "PageIndex": page_index}
+        chargers.extend(data.get("Data", []))
+        page_index += 1
+        if page_index >= data.get("Pages", 1):
+            return chargers
+
+
+def list_chargers(
+    installation_id: Optional[str] = None,
+    name: Optional[str] = None,
+    charger_ids: Optional[list[str]] = None,
+    page_size: int = 100,
+) -> list[dict]:
+    """List chargers page by page, filtered by Zaptec. A name matches chargers
+    whose name contains it."""
+    if charger_ids:
+        chargers = []
+        for charger_id in charger_ids:
+            try:
+                chargers.append(get_charger(charger_id))
+            except requests.HTTPError as error:
+                if error.response is None or error.response.status_code != 404:
+                    raise
+                # A mistyped id should not stop the other chargers
+                warnings.warn(f"Unknown charger id: {charger_id}")
+        return chargers
+
+    pages = charger_list_pages(installation_id, name, page_size)
+    try:
+        params = next(pages)
+        while True:
+            response = make_authenticated_request("GET", "/api/chargers", params=params)
+            params = pages.send(read_json(response))
+    except StopIteration as done:
+        return done.value
 
 
-def get_energy_history(
+# The session retries 429 and 5xx responses, pages are only fetched again when
+# the connection failed
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+def retry_delay(error: requests.RequestException, attempt: int, retries: int) -> int:
+    """Seconds to wait before the next attempt, raises the error if it is not
+    transient or this was the last attempt."""
+    if not isinstance(error, TRANSIENT_ERRORS) or attempt == retries - 1:
+        raise error
+    return 2**attempt
+
+
+def history_params(
     charger_id: str,
     from_date: datetime.datetime,
     to_date: datetime.datetime,
-    page_size: int = 10,
-    progress: Optional[Progress] = None,
-    task_id: Optional[int] = None,
+    page_size: int,
+    page_index: int,
 ) -> dict:
-    energy_history = []
-    charges_count = 0
-    page_index = 0
+    return {
+        "ChargerId": charger_id,
+        "From": from_date.isoformat(),
+        "To": to_date.isoformat(),
+        "PageSize": page_size,
+        "PageIndex": page_index,
+        "DetailLevel": 1,
+    }
 
-    while True:
-        params = {
-            "ChargerId": charger_id,
-            "From": from_date.isoformat(),
-            "To": to_date.isoformat(),
-            "PageSize": page_size,
-            "PageIndex": page_index,
-            "DetailLevel": 1,
-        }
-        response = make_authenticated_request(
-            "GET", "/api/chargehistory", params=params
-        )
-        response.raise_for_status()
-        body = response.json()
-        for session in body["Data"]:
-            charges_count += 1
-            for energy_detail in session.get("EnergyDetails", []):
-                energy_history.append(energy_detail)
 
-        page_index += 1
+def get_history_page(
+    charger_id: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+    page_size: int,
+    page_index: int,
+    retries: int = 3,
+) -> dict:
+    params = history_params(charger_id, from_date, to_date, page_size, page_index)
+    for attempt in range(retries):
+        try:
+            response = make_authenticated_request(
+                "GET", "/api/chargehistory", params=params
+            )
+            return read_json(response)
+        except requests.RequestException as error:
+            time.sleep(retry_delay(error, attempt, retries))
+
+
+def lookahead_pages(page_count: int, max_page_workers: int) -> Iterator[range]:
+    """For each page after the first, in order, the pages to request before
+    waiting for it, so at most max_page_workers pages are in flight."""
+    next_page = 1
+    for page_index in range(1, page_count):
+        end = min(page_count, page_index + max_page_workers)
+        yield range(next_page, end)
+        next_page = end
 
+
+def iter_session_pages(
+    charger_id: str,
+    from_date: datetime.datetime,
+    to_date: datetime.datetime,
+    page_size: int = 10,
+    progress: Optional["Progress"] = None,
+    task_id: Optional[int] = None,
+    max_page_workers: int = 4,
+) -> Iterator[list[dict]]:
+    """Yield the sessions of each page in page order, fetching a few pages ahead."""
+
+    def fetch_page(page_index: int) -> dict:
+        body = get_history_page(charger_id, from_date, to_date, page_size, page_index)
+        metrics.count("zaptec_history_pages")
         if progress and task_id is not None:
             progress.advance(task_id)
+        return body
 
-        if page_index == body["Pages"]:
-            break
+    # The first page tells how many pages there are, the rest are fetched in parallel
+    first_page = fetch_page(0)
+    page_count = first_page["Pages"]
+    yield first_page["Data"]
+    if page_count <= 1:
+        return
+
+    if progress and task_id is not None:
+        progress.update(task_id, total=page_count)
+
+    with ThreadPoolExecutor(max_workers=max_page_workers) as executor:
+        pending = deque()
+        for page_indexes in lookahead_pages(page_count, max_page_workers):
+            pending.extend(executor.submit(fetch_page, i) for i in page_indexes)
+            yield pending.popleft().result()["Data"]
+
+
+class AsyncRateLimiter:
+    """Token bucket for the coroutines of one client, waiters are served in order."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            now = time.monotonic()
+            self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1.0:
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+                self.tokens = 1.0
+                self.updated = time.monotonic()
+            self.tokens -= 1.0
+
+
+class AsyncClient:
+    """Asyncio Zaptec client with its own session, token and rate limit, so one
+    process can drive several accounts concurrently.
+
+    Blocking HTTP calls run in worker threads on the client's pooled session.
+    """
+
+    def __init__(
+        self,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        base_url: Optional[str] = None,
+        rate: Optional[float] = None,
+        session: Optional[requests.Session] = None,
+        max_page_workers: int = 4,
+    ):
+        if username is None or password is None:
+            username, password = config.get_zaptec_credentials()
+        self.username = username
+        self.password = password
+        self.base_url = base_url or config.get_zaptec_base_url()
+        self.session = session or http_client.create_session()
+        self.limiter = AsyncRateLimiter(rate or config.get_zaptec_rate_limit())
+        self.max_page_workers = max_page_workers
+        self._token: Optional[Token] = None
+        self._token_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    async def get_token(self) -> str:
+        # Only one coroutine fetches, the others wait for its token
+        async with self._token_lock:
+            if self._token is None or self._token.expired:
+                self._token = await asyncio.to_thread(
+                    fetch_token,
+                    self.username,
+                    self.password,
+                    self.base_url,
+                    self.session,
+                )
+                metrics.count("zaptec_token_fetches")
+            return self._token.access_token
+
+    async def invalidate_token(self, access_token: str):
+        async with self._token_lock:
+            if self._token and self._token.access_token == access_token:
+                self._token = None
+
+    async def request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        url = f"{self.base_url}{endpoint}"
+        extra_headers = kwargs.pop("headers", {})
+
+        for attempt in range(2):
+            token = await self.get_token()
+            headers = get_headers(token)
+            headers.update(extra_headers)
+
+            await self.limiter.acquire()
+            response = await asyncio.to_thread(
+                http_client.request,
+                method,
+                url,
+                session=self.session,
+                headers=headers,
+                **kwargs,
+            )
+            if response.status_code != 401:
+                break
+            # Many coroutines may get a 401 at once, only the first one
+            # invalidates and the token is fetched once
+            await self.invalidate_token(token)
+
+        return response
+
+    async def list_chargers(
+        self,
+        installation_id: Optional[str] = None,
+        name: Optional[str] = None,
+        page_size: int = 100,
+    ) -> list[dict]:
+        pages = charger_list_pages(installation_id, name, page_size)
+        try:
+            params = next(pages)
+            while True:
+                response = await self.request("GET", "/api/chargers", params=params)
+                params = pages.send(read_json(response))
+        except StopIteration as done:
+            return done.value
+
+    async def get_history_page(
+        self,
+        charger_id: str,
+        from_date: datetime.datetime,
+        to_date: datetime.datetime,
+        page_size: int,
+        page_index: int,
+        retries: int = 3,
+    ) -> dict:
+        params = history_params(charger_id, from_date, to_date, page_size, page_index)
+        for attempt in range(retries):
+            try:
+                response = await self.request(
+                    "GET", "/api/chargehistory", params=params
+                )
+                body = read_json(response)
+                metrics.count("zaptec_history_pages")
+                return body
+            except requests.RequestException as error:
+                await asyncio.sleep(retry_delay(error, attempt, retries))
+
+    async def iter_session_pages(
+        self,
+        charger_id: str,
+        from_date: datetime.datetime,
+        to_date: datetime.datetime,
+        page_size: int = 50,
+    ) -> AsyncIterator[list[dict]]:
+        """Yield the sessions of each page in page order, fetching a few pages ahead."""
+
+        def fetch_page(page_index: int) -> asyncio.Task:
+            return asyncio.create_task(
+                self.get_history_page(
+                    charger_id, from_date, to_date, page_size, page_index
+                )
+            )
+
+        first_page = await self.get_history_page(
+            charger_id, from_date, to_date, page_size, 0
+        )
+        yield first_page["Data"]
 
-    return energy_history, charges_count
+        pending = deque()
+        try:
+            for page_indexes in lookahead_pages(
+                first_page["Pages"], self.max_page_workers
+            ):
+                pending.extend(fetch_page(i) for i in page_indexes)
+                yield (await pending.popleft())["Data"]
+        finally:
+            # A consumer that stops early leaves no requests behind
+            for task in pending:
+                task.cancel()